@@ -0,0 +1,267 @@
+"""
+Combinación de GIF y WebP animados fotograma a fotograma
+
+`open_image` solo ve el primer fotograma de una entrada animada. Aquí cada
+entrada se recorre en su propio tiempo: la animación de salida dura lo que
+la entrada más larga, las más cortas se repiten en bucle y las estáticas
+quedan fijas. Los cortes de la salida son la unión de los cambios de
+fotograma de todas las entradas (los más próximos que
+`animation_min_frame_ms` se fusionan).
+
+Los fotogramas se generan de uno en uno sobre un único lienzo, repintando
+solo las entradas que cambiaron, y se entregan al codificador según se
+producen: en memoria hay un fotograma de salida y el fotograma actual de
+cada entrada, no la animación completa.
+"""
+
+import bisect
+import struct
+from PIL import Image
+from config import APP_CONFIG
+from gif_writer import write_gif_frames
+
+ANIMATED_FORMATS = ("GIF", "WEBP")
+
+
+def _skip_gif_sub_blocks(f):
+    """Avanzar tras una secuencia de sub-bloques GIF terminada en 0"""
+    while True:
+        length = f.read(1)
+        if not length or length == b"\x00":
+            return
+        f.seek(length[0], 1)
+
+
+def _gif_durations(f):
+    """Duraciones de un GIF leyendo sus bloques sin descomprimir la imagen"""
+    header = f.read(13)
+    if header[10] & 0x80:
+        f.seek(3 << ((header[10] & 7) + 1), 1)
+    
+    durations = []
+    delay = 0
+    while True:
+        block = f.read(1)
+        if block == b"!":
+            label = f.read(1)
+            if label == b"\xf9":
+                # Control gráfico: el retardo va en centésimas de segundo
+                data = f.read(5)
+                delay = struct.unpack("<H", data[2:4])[0] * 10
+            _skip_gif_sub_blocks(f)
+        elif block == b",":
+            flags = f.read(9)[8]
+            if flags & 0x80:
+                f.seek(3 << ((flags & 7) + 1), 1)
+            f.seek(1, 1)  # tamaño mínimo de código LZW
+            _skip_gif_sub_blocks(f)
+            durations.append(delay)
+            delay = 0
+        else:
+            # Fin del archivo (";") o datos truncados
+            return durations
+
+
+def _webp_durations(f):
+    """Duraciones de un WebP animado leyendo solo las cabeceras de los ANMF"""
+    f.seek(12)
+    durations = []
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return durations
+        fourcc, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if fourcc == b"ANMF":
+            # X, Y, ancho y alto (3 bytes cada uno) y luego la duración
+            payload = f.read(15)
+            durations.append(int.from_bytes(payload[12:15], "little"))
+            f.seek(size + (size & 1) - 15, 1)
+        else:
+            f.seek(size + (size & 1), 1)
+
+
+def frame_durations(file_path):
+    """Duración en ms de cada fotograma, o None si la imagen es estática
+    
+    En GIF y WebP se leen de las cabeceras de cada fotograma sin
+    decodificarlos; en otros formatos se recorren los fotogramas con Pillow.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(12)
+        f.seek(0)
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            durations = _gif_durations(f)
+        elif head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            durations = _webp_durations(f)
+        else:
+            durations = None
+    
+    if durations is None:
+        with Image.open(file_path) as img:
+            durations = []
+            for index in range(getattr(img, "n_frames", 1)):
+                img.seek(index)
+                img.load()
+                durations.append(img.info.get("duration", 0))
+    
+    if len(durations) < 2:
+        return None
+    default = APP_CONFIG["animation_default_frame_ms"]
+    return [duration or default for duration in durations]
+
+
+def build_timeline(durations, min_frame_ms=None):
+    """Inicio en ms de cada fotograma de salida y duración total
+    
+    `durations` tiene, por entrada, la lista de duraciones de sus fotogramas
+    (None para las estáticas).
+    """
+    min_frame_ms = min_frame_ms or APP_CONFIG["animation_min_frame_ms"]
+    animated = [d for d in durations if d]
+    if not animated:
+        raise ValueError("Ninguna de las entradas tiene varios fotogramas")
+    total = max(sum(d) for d in animated)
+    
+    cuts = set()
+    for source in animated:
+        start = 0
+        while start < total:
+            for duration in source:
+                cuts.add(start)
+                start += duration
+                if start >= total:
+                    break
+    
+    starts = []
+    for cut in sorted(cuts):
+        if starts and (cut - starts[-1] < min_frame_ms or total - cut < min_frame_ms):
+            continue
+        starts.append(cut)
+    return starts, total
+
+
+class AnimatedSource:
+    """Entrada abierta durante la animación, posicionada en el fotograma que toca"""
+    
+    def __init__(self, file_path, durations):
+        self.image = Image.open(file_path)
+        self.starts = [0]
+        for duration in durations[:-1]:
+            self.starts.append(self.starts[-1] + duration)
+        self.length = sum(durations)
+    
+    def frame_at(self, time_ms):
+        """Índice del fotograma visible en `time_ms`, repitiendo en bucle"""
+        return bisect.bisect_right(self.starts, time_ms % self.length) - 1
+    
+    def frame(self, index, size):
+        """Fotograma `index` en RGBA al tamaño de su colocación"""
+        self.image.seek(index)
+        frame = self.image.convert("RGBA")
+        if frame.size != tuple(size):
+            frame = frame.resize(size, Image.Resampling.LANCZOS)
+        return frame
+    
+    def close(self):
+        self.image.close()
+
+
+def iter_frames(processor, plan, durations, starts, progress_callback=None):
+    """Generar los fotogramas de salida sobre un único lienzo
+    
+    El lienzo se reutiliza: cada fotograma debe codificarse antes de pedir el
+    siguiente. Las entradas estáticas se pegan una sola vez.
+    """
+    canvas = processor.create_plan_canvas(plan)
+    sources = [None] * len(plan)
+    current = [None] * len(plan)
+    try:
+        for i, placement in enumerate(plan.placements):
+            if durations[i]:
+                sources[i] = AnimatedSource(placement.path, durations[i])
+            else:
+                image = processor.open_image(
+                    placement.path, (placement.width, placement.height),
+                    plan.source_mode(placement)
+                )
+                processor.paste_image(canvas, image, (placement.x, placement.y))
+                del image
+        
+        for count, start in enumerate(starts):
+            if progress_callback:
+                progress_callback(count, len(starts))
+            for i, placement in enumerate(plan.placements):
+                if sources[i] is None:
+                    continue
+                index = sources[i].frame_at(start)
+                if index == current[i]:
+                    continue
+                
+                # Limpiar la celda: el fotograma nuevo puede tener transparencia
+                x, y, width, height = placement[1:5]
+                canvas.paste(processor.create_plan_canvas(plan, (width, height)), (x, y))
+                processor.paste_image(canvas, sources[i].frame(index, (width, height)), (x, y))
+                current[i] = index
+            yield canvas
+    finally:
+        for source in sources:
+            if source is not None:
+                source.close()
+
+
+class FrameSequence:
+    """Adaptador multi-fotograma para `append_images` de Pillow
+    
+    Pillow recorre cada imagen adjunta con `seek()`; aquí cada `seek()` toma
+    el siguiente fotograma del generador, así que no se guardan todos.
+    """
+    
+    def __init__(self, frames, count, mode):
+        self.frames = frames
+        self.n_frames = count
+        self.mode = mode
+        self.current = None
+    
+    def seek(self, index):
+        self.current = next(self.frames)
+    
+    def tell(self):
+        return 0
+    
+    def getim(self):
+        return self.current.getim()
+
+
+def write_animation(processor, plan, file_path, format="GIF", quality=90,
+                    progress_callback=None):
+    """Componer un plan fotograma a fotograma y escribirlo como GIF o WebP animado
+    
+    Devuelve un dict con el tamaño del lienzo, el número de fotogramas y la
+    duración total en ms.
+    """
+    format = format.upper()
+    if format not in ANIMATED_FORMATS:
+        raise ValueError(f"La animación solo se guarda en GIF o WebP, no en {format}")
+    
+    durations = [frame_durations(path) for path in plan.paths]
+    starts, total = build_timeline(durations)
+    frame_lengths = [end - start for start, end in zip(starts, starts[1:] + [total])]
+    frames = iter_frames(processor, plan, durations, starts, progress_callback)
+    loop = APP_CONFIG["animation_loop"]
+    
+    try:
+        if format == "GIF":
+            write_gif_frames(file_path, plan.canvas_size, frames, frame_lengths, loop)
+        else:
+            first = next(frames)
+            first.save(
+                file_path, "WEBP", save_all=True, duration=frame_lengths, loop=loop,
+                quality=quality,
+                append_images=[FrameSequence(frames, len(starts) - 1, first.mode)],
+            )
+    except Exception as e:
+        raise Exception(f"Error al guardar la animación: {str(e)}")
+    finally:
+        frames.close()
+    
+    return {"size": plan.canvas_size, "frames": len(starts), "duration_ms": total}
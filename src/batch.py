@@ -0,0 +1,189 @@
+"""
+Ejecución por lotes de muchas combinaciones a partir de un manifiesto
+
+El manifiesto puede ser JSON (una lista de trabajos o {"jobs": [...]}) o CSV
+con una fila por trabajo. Campos de cada trabajo:
+
+    inputs      lista de rutas (en CSV, separadas por ";")
+    output      archivo de salida, o lista de archivos para guardar el mismo
+                resultado en varios formatos (en CSV, separados por ";")
+    mode        vertical | horizontal | grid | packed  (opcional)
+    columns, rows, cell_sizing  opciones de la cuadrícula  (opcional)
+    spacing     píxeles entre imágenes            (opcional)
+    background  color de fondo o "transparent"    (opcional)
+    format      png | jpeg | webp...              (opcional, según extensión)
+    quality     1-100                             (opcional)
+    png_profile fast | balanced | smallest        (opcional)
+    max_kb      tamaño máximo de JPEG/WebP en KB; las PNG usan entonces
+                el perfil "smallest" si no se indica otro  (opcional)
+    max_dimension  lado máximo del resultado      (opcional)
+
+Las rutas relativas se resuelven respecto a la carpeta del manifiesto.
+"""
+
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from config import APP_CONFIG
+from image_processor import ImageProcessor, resolve_format
+
+
+def load_manifest(manifest_path):
+    """Leer un manifiesto JSON o CSV y devolver la lista de trabajos normalizada"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, newline="", encoding="utf-8") as f:
+            raw_jobs = list(csv.DictReader(f))
+        for job in raw_jobs:
+            job["inputs"] = [p.strip() for p in job.get("inputs", "").split(";") if p.strip()]
+            job["output"] = [p.strip() for p in job.get("output", "").split(";") if p.strip()]
+    else:
+        with open(manifest_path, encoding="utf-8") as f:
+            data = json.load(f)
+        raw_jobs = data["jobs"] if isinstance(data, dict) else data
+    
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+    
+    jobs = []
+    for index, raw in enumerate(raw_jobs):
+        if not raw.get("inputs") or not raw.get("output"):
+            raise ValueError(f"El trabajo {index + 1} necesita 'inputs' y 'output'")
+        
+        outputs = raw["output"] if isinstance(raw["output"], list) else [raw["output"]]
+        jobs.append({
+            "id": str(raw.get("id") or index + 1),
+            "inputs": [resolve(p) for p in raw["inputs"]],
+            "output": resolve(outputs[0]),
+            "extra_outputs": [resolve(p) for p in outputs[1:]],
+            "mode": raw.get("mode") or "vertical",
+            "spacing": int(raw.get("spacing") or APP_CONFIG["default_spacing"]),
+            "background": raw.get("background") or APP_CONFIG["default_background"],
+            "format": raw.get("format") or None,
+            "quality": int(raw.get("quality") or APP_CONFIG["default_quality"]),
+            "png_profile": raw.get("png_profile") or None,
+            "max_kb": int(raw["max_kb"]) if raw.get("max_kb") else None,
+            "max_dimension": int(raw["max_dimension"]) if raw.get("max_dimension") else None,
+            "layout_options": {
+                "columns": int(raw["columns"]) if raw.get("columns") else None,
+                "rows": int(raw["rows"]) if raw.get("rows") else None,
+                "cell_sizing": raw.get("cell_sizing") or None,
+            },
+        })
+    return jobs
+
+
+def estimate_job_memory(processor, job):
+    """Estimar el pico de memoria de un trabajo leyendo solo cabeceras"""
+    plan = processor.plan_layout(
+        job["inputs"], job["mode"], job["spacing"], job["background"],
+        job["max_dimension"], job["layout_options"]
+    )
+    return plan.estimate_bytes()
+
+
+def run_job(job, decode_workers=1):
+    """Ejecutar un trabajo (en un proceso del pool) y devolver su resultado"""
+    processor = ImageProcessor()
+    result = {"id": job["id"], "output": job["output"], "inputs": len(job["inputs"])}
+    start = time.perf_counter()
+    timings = {}
+    
+    try:
+        outputs = [(job["output"], resolve_format(job["output"], job["format"]), job["quality"])]
+        outputs += [(path, resolve_format(path), job["quality"]) for path in job["extra_outputs"]]
+        image = processor.merge_files(
+            job["inputs"], job["mode"], job["spacing"], job["background"],
+            max_dimension=job["max_dimension"], workers=decode_workers, timings=timings,
+            layout_options=job["layout_options"]
+        )
+        
+        save_start = time.perf_counter()
+        for path, _, _ in outputs:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        max_bytes = job["max_kb"] * 1024 if job["max_kb"] else None
+        saved = processor.save_outputs(image, outputs, job["png_profile"], max_bytes=max_bytes)
+        timings["guardado"] = time.perf_counter() - save_start
+        
+        result.update({
+            "status": "ok",
+            "width": image.width,
+            "height": image.height,
+            "bytes": saved[0]["bytes"],
+        })
+        if len(saved) > 1 or max_bytes:
+            result["outputs"] = saved
+    except Exception as e:
+        result.update({"status": "error", "error": str(e)})
+    
+    result["seconds"] = time.perf_counter() - start
+    result["timings"] = timings
+    return result
+
+
+def run_batch(jobs, concurrency=None, memory_budget=None, decode_workers=1,
+              progress_callback=None):
+    """Ejecutar trabajos en un pool de procesos respetando un presupuesto de memoria
+    
+    Los trabajos se lanzan en orden; uno nuevo solo entra si la suma de las
+    estimaciones de los que están en curso cabe en `memory_budget` (bytes).
+    Un trabajo mayor que el presupuesto se ejecuta solo. Devuelve un informe
+    con un resultado por trabajo, en el orden del manifiesto.
+    """
+    processor = ImageProcessor()
+    concurrency = concurrency or os.cpu_count() or 1
+    start = time.perf_counter()
+    
+    estimates = []
+    for job in jobs:
+        try:
+            estimates.append(estimate_job_memory(processor, job))
+        except Exception:
+            # El error real se informará al ejecutar el trabajo
+            estimates.append(0)
+    
+    results = [None] * len(jobs)
+    running = {}
+    in_use = 0
+    next_job = 0
+    
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        while next_job < len(jobs) or running:
+            while next_job < len(jobs) and len(running) < concurrency:
+                estimate = estimates[next_job]
+                if running and memory_budget and in_use + estimate > memory_budget:
+                    break
+                future = pool.submit(run_job, jobs[next_job], decode_workers)
+                running[future] = next_job
+                in_use += estimate
+                next_job += 1
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                in_use -= estimates[index]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = {
+                        "id": jobs[index]["id"], "output": jobs[index]["output"],
+                        "status": "error", "error": str(e),
+                    }
+                results[index]["estimated_bytes"] = estimates[index]
+                if progress_callback:
+                    progress_callback(results[index], len(jobs))
+    
+    return {
+        "jobs": results,
+        "total": len(jobs),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "errors": sum(1 for r in results if r["status"] != "ok"),
+        "concurrency": concurrency,
+        "memory_budget": memory_budget,
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,319 @@
+"""
+Mediciones de rendimiento reproducibles
+
+Las imágenes sintéticas imitan capturas de pantalla (fondos planos, bloques
+de color y texto, con una zona de ruido tipo foto), fotos y recortes con
+transparencia, para que los resultados sean comparables entre máquinas y
+versiones sin depender de archivos externos.
+
+`run_benchmarks` genera cada corpus en disco y mide, con tiempo,
+megapíxeles por segundo y pico de memoria residente:
+
+- merge: la combinación completa que usan la GUI y la CLI (`merge_files`,
+  en streaming desde disco) en cada modo de disposición.
+- decode, layout, composite: las etapas por separado (`open_image`,
+  `plan_layout` con la caché de cabeceras vacía y cada `combine_images_*`
+  sobre imágenes ya decodificadas).
+- encode: `save_image` en cada formato.
+
+`benchmark_png_profiles` (subcomando bench-png) compara los perfiles PNG.
+"""
+
+import io
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import PIL
+from PIL import Image, ImageDraw
+from config import APP_CONFIG
+from image_processor import ImageProcessor, save_png
+from layout import LAYOUT_MODES
+from memory_usage import get_rss_bytes
+
+# Corpus sintéticos: (tipo, número de imágenes, tamaños posibles)
+CORPORA = {
+    "small_screenshots": ("screenshot", 200, [(640, 400)]),
+    "huge_photos": ("photo", 3, [(6000, 4000)]),
+    "mixed_sizes": ("screenshot", 40, [(320, 240), (1280, 720), (1920, 1080), (3000, 2000)]),
+    "alpha": ("alpha", 30, [(800, 600)]),
+}
+
+COMPOSITE_MODES = ("vertical", "horizontal", "grid")
+ENCODE_FORMATS = ("PNG", "JPEG", "WEBP", "BMP", "TIFF")
+FORMAT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp", "BMP": ".bmp", "TIFF": ".tif"}
+
+# Intervalo de muestreo de la memoria residente durante cada etapa
+RSS_SAMPLE_SECONDS = 0.005
+
+
+def synthetic_screenshot(size=(1920, 1080), seed=0):
+    """Generar una captura de pantalla sintética y determinista"""
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGB", size, "#f3f3f3")
+    draw = ImageDraw.Draw(image)
+    
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randint(50, 600), y + rng.randint(20, 300)), fill=color)
+    for _ in range(width * height // 5000):
+        draw.text((rng.randrange(width), rng.randrange(height)),
+                  "Lorem ipsum dolor sit amet 0123", fill=(20, 20, 20))
+    
+    photo = Image.effect_noise((max(1, width // 4), max(1, height // 4)), 40).convert("RGB")
+    image.paste(photo, (rng.randrange(width - photo.width + 1), rng.randrange(height - photo.height + 1)))
+    return image
+
+
+def synthetic_photo(size=(6000, 4000), seed=0):
+    """Generar una foto sintética: degradado suave con ruido de sensor"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").rotate(rng.randrange(360)).resize(size)
+    channels = [
+        Image.blend(gradient, Image.effect_noise(size, rng.randint(20, 60)), 0.3)
+        for _ in range(3)
+    ]
+    return Image.merge("RGB", channels)
+
+
+def synthetic_cutout(size=(800, 600), seed=0):
+    """Generar un recorte RGBA: una captura con bordes transparentes"""
+    image = synthetic_screenshot(size, seed).convert("RGBA")
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size[0] - 1, size[1] - 1), fill=255)
+    image.putalpha(mask)
+    return image
+
+
+def write_corpus(name, folder, scale=1.0):
+    """Escribir en `folder` las imágenes del corpus y devolver sus rutas
+    
+    `scale` reduce los lados de cada imagen para ejecuciones rápidas.
+    """
+    kind, count, sizes = CORPORA[name]
+    rng = random.Random(name)
+    paths = []
+    for i in range(count):
+        width, height = rng.choice(sizes)
+        size = (max(16, int(width * scale)), max(16, int(height * scale)))
+        if kind == "photo":
+            path = os.path.join(folder, f"{name}_{i:04d}.jpg")
+            synthetic_photo(size, seed=i).save(path, "JPEG", quality=90)
+        elif kind == "alpha":
+            path = os.path.join(folder, f"{name}_{i:04d}.png")
+            synthetic_cutout(size, seed=i).save(path, "PNG", compress_level=1)
+        else:
+            path = os.path.join(folder, f"{name}_{i:04d}.png")
+            synthetic_screenshot(size, seed=i).save(path, "PNG", compress_level=1)
+        paths.append(path)
+    return paths
+
+
+class RssSampler:
+    """Muestrear la memoria residente en un hilo mientras dura una etapa"""
+    
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_bytes = get_rss_bytes()
+        self.peak_bytes = self.start_bytes
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+    
+    def _sample(self):
+        rss = get_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+def measure_stage(function, megapixels, repeat=1):
+    """Ejecutar una etapa y devolver (resultado, medidas)
+    
+    El tiempo es el mejor de `repeat`; el pico de memoria, el mayor de todas
+    las ejecuciones (residente del proceso y su aumento sobre el inicio).
+    """
+    best = None
+    peak = None
+    peak_delta = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        with RssSampler() as sampler:
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if sampler.peak_bytes is not None:
+            peak = max(peak or 0, sampler.peak_bytes)
+            peak_delta = max(peak_delta or 0, sampler.peak_bytes - sampler.start_bytes)
+    
+    return result, {
+        "seconds": best,
+        "megapixels": megapixels,
+        "mp_per_second": megapixels / best if best else 0.0,
+        "peak_rss_bytes": peak,
+        "peak_rss_delta_bytes": peak_delta,
+    }
+
+
+def benchmark_png_profiles(image, profiles=None, repeat=1):
+    """Medir tiempo y tamaño de cada perfil PNG codificando en memoria
+    
+    En los perfiles con varias alternativas el tiempo incluye todas. Devuelve
+    una lista de dicts con el perfil, los segundos (mejor de `repeat`), los
+    bytes y los megapíxeles por segundo.
+    """
+    profiles = profiles or list(APP_CONFIG["png_profiles"])
+    processor = ImageProcessor()
+    megapixels = image.width * image.height / 1e6
+    results = []
+    for profile in profiles:
+        candidates = processor.png_save_options(profile)
+        best = None
+        for _ in range(repeat):
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            save_png(image, buffer, candidates)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append({
+            "profile": profile,
+            "seconds": best,
+            "bytes": buffer.tell(),
+            "mp_per_second": megapixels / best if best else 0.0,
+        })
+    return results
+
+
+def benchmark_corpus(processor, name, paths, folder, repeat=1, progress_callback=None):
+    """Medir las etapas de un corpus y devolver una lista de resultados"""
+    results = []
+    
+    def record(stage, variant, function, megapixels):
+        if progress_callback:
+            progress_callback(name, stage, variant)
+        try:
+            value, metrics = measure_stage(function, megapixels, repeat)
+        except Exception as e:
+            results.append({"corpus": name, "stage": stage, "variant": variant, "error": str(e)})
+            return None
+        results.append(dict({"corpus": name, "stage": stage, "variant": variant}, **metrics))
+        return value
+    
+    mode = "RGBA" if CORPORA[name][0] == "alpha" else "RGB"
+    sizes = [processor.get_image_size(path) for path in paths]
+    source_mp = sum(w * h for w, h in sizes) / 1e6
+    
+    # Cada repetición usa un procesador nuevo: la caché de cabeceras empieza
+    # vacía, como en la primera combinación de una carpeta
+    for layout_mode in LAYOUT_MODES:
+        record(
+            "merge", layout_mode,
+            lambda: ImageProcessor().merge_files(paths, layout_mode), source_mp
+        )
+    
+    images = record(
+        "decode", mode, lambda: [processor.open_image(path, mode=mode) for path in paths], source_mp
+    )
+    if images is None:
+        return results
+    
+    for layout_mode in COMPOSITE_MODES:
+        record(
+            "layout", layout_mode,
+            lambda: ImageProcessor().plan_layout(paths, layout_mode), source_mp
+        )
+    
+    canvas = None
+    for layout_mode in COMPOSITE_MODES:
+        combine = getattr(processor, f"combine_images_{layout_mode}")
+        result = record("composite", layout_mode, lambda: combine(images), source_mp)
+        # La cuadrícula es la más cercana a cuadrada: cabe en los límites de WebP
+        if layout_mode == "grid":
+            canvas = result
+        del result
+    del images
+    
+    if canvas is not None:
+        canvas_mp = canvas.width * canvas.height / 1e6
+        for format in ENCODE_FORMATS:
+            output = os.path.join(folder, f"{name}_output{FORMAT_EXTENSIONS[format]}")
+            saved = record(
+                "encode", format,
+                lambda: processor.save_image(canvas, output, format, APP_CONFIG["default_quality"]),
+                canvas_mp
+            )
+            if saved:
+                results[-1]["bytes"] = os.path.getsize(output)
+                os.remove(output)
+    return results
+
+
+def run_benchmarks(corpora=None, scale=1.0, repeat=1, work_dir=None, progress_callback=None):
+    """Generar los corpus sintéticos, medir todas las etapas y devolver el informe
+    
+    El informe es serializable a JSON: entorno (versiones de Python, Pillow y
+    la aplicación, núcleos), tamaño de cada corpus y una lista de resultados
+    por corpus, etapa y variante (modo de composición o formato).
+    `progress_callback(corpus, etapa, variante)` se llama antes de cada medida.
+    """
+    corpora = corpora or list(CORPORA)
+    for name in corpora:
+        if name not in CORPORA:
+            raise ValueError(f"Corpus desconocido: {name} (disponibles: {', '.join(CORPORA)})")
+    
+    folder = work_dir or tempfile.mkdtemp(prefix="fusion_bench_")
+    os.makedirs(folder, exist_ok=True)
+    processor = ImageProcessor()
+    report = {
+        "app_version": APP_CONFIG["version"],
+        "python": sys.version.split()[0],
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "repeat": repeat,
+        "corpora": {},
+        "results": [],
+    }
+    
+    try:
+        for name in corpora:
+            paths = write_corpus(name, folder, scale)
+            report["corpora"][name] = {
+                "files": len(paths),
+                "megapixels": sum(
+                    w * h for w, h in (processor.get_image_size(p) for p in paths)
+                ) / 1e6,
+                "bytes": sum(os.path.getsize(p) for p in paths),
+            }
+            report["results"] += benchmark_corpus(
+                processor, name, paths, folder, repeat, progress_callback
+            )
+            if work_dir is None:
+                for path in paths:
+                    os.remove(path)
+    finally:
+        if work_dir is None:
+            shutil.rmtree(folder, ignore_errors=True)
+    
+    return report
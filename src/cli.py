@@ -0,0 +1,565 @@
+"""
+Interfaz de línea de comandos para combinar imágenes sin entorno gráfico
+
+Este módulo no importa tkinter, de modo que puede usarse en servidores sin
+pantalla:
+
+    image-merger merge --mode grid --spacing 10 --format webp -o out.webp a.png b.png
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from PIL import Image
+from config import APP_CONFIG
+from image_processor import ImageProcessor, resolve_format
+from scanner import scan_folder
+from dedup import find_duplicates
+from layout import LAYOUT_MODES, CELL_SIZINGS, LayoutPlan
+
+
+def expand_inputs(processor, inputs, recursive=False):
+    """Expandir carpetas a sus imágenes (en orden alfabético) y validar archivos"""
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            index = scan_folder(
+                entry, processor.supported_formats, recursive=recursive, processor=processor
+            )
+            paths.extend(index.paths())
+        elif processor.validate_image(entry):
+            paths.append(entry)
+        else:
+            raise ValueError(f"Archivo no soportado: {entry}")
+    return paths
+
+
+def positive_int(value):
+    """Tipo de argparse: entero mayor que cero"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"debe ser mayor que cero: {value}")
+    return number
+
+
+def non_negative_int(value):
+    """Tipo de argparse: entero mayor o igual que cero"""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"no puede ser negativo: {value}")
+    return number
+
+
+def add_layout_arguments(parser):
+    """Opciones de disposición comunes a merge y watch"""
+    parser.add_argument(
+        "--mode", choices=LAYOUT_MODES, default="vertical",
+        help="Disposición de las imágenes (por defecto: vertical)",
+    )
+    parser.add_argument("--columns", type=positive_int, help="Columnas de la cuadrícula (por defecto: 2)")
+    parser.add_argument("--rows", type=positive_int, help="Filas de la cuadrícula, si no se dan columnas")
+    parser.add_argument(
+        "--cell-sizing", choices=CELL_SIZINGS,
+        help="Celdas del tamaño de la mayor imagen o ajustadas por fila y columna",
+    )
+
+
+def layout_options(args):
+    """Opciones de disposición indicadas en la línea de comandos"""
+    return {"columns": args.columns, "rows": args.rows, "cell_sizing": args.cell_sizing}
+
+
+def build_parser():
+    """Construir el parser de argumentos"""
+    parser = argparse.ArgumentParser(
+        prog="image-merger",
+        description="Combinar varias imágenes en una sola sin interfaz gráfica",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    merge = subparsers.add_parser("merge", help="Combinar imágenes en un archivo")
+    merge.add_argument("inputs", nargs="+", help="Imágenes o carpetas de entrada")
+    merge.add_argument(
+        "-o", "--output", action="append",
+        help="Archivo de salida (obligatorio salvo con --dry-run); se repite para "
+             "guardar varios formatos a la vez",
+    )
+    add_layout_arguments(merge)
+    merge.add_argument(
+        "--spacing", type=non_negative_int, default=APP_CONFIG["default_spacing"],
+        help="Espacio entre imágenes en píxeles",
+    )
+    merge.add_argument(
+        "--background", default=APP_CONFIG["default_background"],
+        help="Color de fondo (nombre, #RRGGBB o 'transparent')",
+    )
+    merge.add_argument(
+        "--format", dest="format_name",
+        help="Formato de salida (png, jpeg, webp...); por defecto según la extensión",
+    )
+    merge.add_argument(
+        "--quality", type=int, default=APP_CONFIG["default_quality"],
+        help="Calidad para JPEG/WebP (1-100)",
+    )
+    merge.add_argument(
+        "--png-profile", choices=list(APP_CONFIG["png_profiles"]),
+        help=f"Perfil de codificación PNG (por defecto: {APP_CONFIG['png_profile']})",
+    )
+    merge.add_argument(
+        "--max-kb", type=int,
+        help="Tamaño máximo de las salidas JPEG/WebP; se busca la mayor calidad que quepa",
+    )
+    merge.add_argument(
+        "--max-dimension", type=int,
+        help="Lado máximo del resultado; las fuentes se decodifican ya reducidas",
+    )
+    merge.add_argument(
+        "--workers", type=int,
+        help="Hilos de decodificación (por defecto: número de núcleos)",
+    )
+    merge.add_argument(
+        "--low-memory", action="store_true",
+        help="Escribir PNG por franjas sin mantener el lienzo en memoria",
+    )
+    merge.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="Incluir imágenes de subcarpetas al pasar carpetas como entrada",
+    )
+    merge.add_argument(
+        "--dedup", choices=["exact", "near"],
+        help="Detectar duplicados exactos o también casi idénticos y omitirlos",
+    )
+    merge.add_argument(
+        "--keep-duplicates", action="store_true",
+        help="Con --dedup, solo informar de los duplicados sin omitirlos",
+    )
+    merge.add_argument(
+        "--incremental", action="store_true",
+        help="Reutilizar la salida anterior y su manifiesto si solo cambió la cola",
+    )
+    merge.add_argument(
+        "--animated", action="store_true",
+        help="Combinar GIF/WebP animados fotograma a fotograma (salida GIF o WebP)",
+    )
+    merge.add_argument(
+        "--dry-run", action="store_true",
+        help="Calcular solo la disposición con las cabeceras y mostrar tamaño y memoria",
+    )
+    merge.add_argument(
+        "--save-plan", metavar="PLAN",
+        help="Guardar el plan de disposición en JSON (se usa con 'compose')",
+    )
+    merge.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="No mostrar progreso ni resumen",
+    )
+    
+    compose = subparsers.add_parser("compose", help="Componer un plan de disposición guardado")
+    compose.add_argument("plan", help="Plan JSON creado con 'merge --save-plan'")
+    compose.add_argument("-o", "--output", required=True, help="Archivo de salida")
+    compose.add_argument("--format", dest="format_name", help="Formato de salida")
+    compose.add_argument("--quality", type=int, default=APP_CONFIG["default_quality"])
+    compose.add_argument("--png-profile", choices=list(APP_CONFIG["png_profiles"]))
+    compose.add_argument(
+        "--low-memory", action="store_true",
+        help="Escribir PNG por franjas sin mantener el lienzo en memoria",
+    )
+    compose.add_argument("-q", "--quiet", action="store_true")
+    
+    batch = subparsers.add_parser("batch", help="Ejecutar un manifiesto de trabajos")
+    batch.add_argument("manifest", help="Manifiesto JSON o CSV")
+    batch.add_argument(
+        "-j", "--jobs", type=int,
+        help="Trabajos en paralelo (por defecto: número de núcleos)",
+    )
+    batch.add_argument(
+        "--memory-budget-mb", type=int,
+        help="Memoria estimada máxima de los trabajos en curso",
+    )
+    batch.add_argument(
+        "--decode-workers", type=int, default=1,
+        help="Hilos de decodificación por trabajo (por defecto: 1)",
+    )
+    batch.add_argument("--report", help="Guardar el informe JSON en este archivo")
+    batch.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="No mostrar progreso ni resumen",
+    )
+    
+    watch = subparsers.add_parser("watch", help="Vigilar carpetas y combinar lo que llega")
+    watch.add_argument("folders", nargs="+", help="Carpetas a vigilar")
+    watch.add_argument("-o", "--output-dir", required=True, help="Carpeta de resultados")
+    add_layout_arguments(watch)
+    watch.add_argument("--spacing", type=non_negative_int, default=APP_CONFIG["default_spacing"])
+    watch.add_argument("--background", default=APP_CONFIG["default_background"])
+    watch.add_argument("--format", dest="format_name", default="png", help="Formato de salida")
+    watch.add_argument("--quality", type=int, default=APP_CONFIG["default_quality"])
+    watch.add_argument("--png-profile", choices=list(APP_CONFIG["png_profiles"]))
+    watch.add_argument(
+        "--group-pattern",
+        help="Regex sobre el nombre; el primer grupo de captura define el trabajo",
+    )
+    watch.add_argument("--group-size", type=int, help="Combinar al reunir N archivos")
+    watch.add_argument(
+        "--idle-seconds", type=float, default=5.0,
+        help="Combinar un grupo tras estos segundos sin archivos nuevos",
+    )
+    watch.add_argument("--poll-interval", type=float, default=1.0)
+    watch.add_argument(
+        "--no-inotify", action="store_true",
+        help="Usar siempre sondeo en lugar de inotify",
+    )
+    watch.add_argument(
+        "--include-existing", action="store_true",
+        help="Procesar también los archivos que ya están en las carpetas",
+    )
+    
+    bench_png = subparsers.add_parser(
+        "bench-png", help="Comparar tiempo y tamaño de los perfiles PNG"
+    )
+    bench_png.add_argument(
+        "inputs", nargs="*",
+        help="Imágenes a codificar (por defecto: capturas sintéticas)",
+    )
+    bench_png.add_argument("--repeat", type=int, default=3, help="Repeticiones por perfil")
+    bench_png.add_argument("--report", help="Guardar los resultados en JSON")
+    
+    bench = subparsers.add_parser(
+        "bench", help="Medir decodificación, disposición, composición y codificación"
+    )
+    bench.add_argument(
+        "--corpus", action="append",
+        help="Corpus sintético a medir; se repite (por defecto: todos)",
+    )
+    bench.add_argument(
+        "--scale", type=float, default=1.0,
+        help="Factor de los lados de las imágenes sintéticas (p. ej. 0.25 para una prueba rápida)",
+    )
+    bench.add_argument("--repeat", type=int, default=1, help="Repeticiones por medida")
+    bench.add_argument(
+        "--work-dir",
+        help="Carpeta donde generar los corpus y conservarlos (por defecto: temporal)",
+    )
+    bench.add_argument("--report", help="Guardar el informe JSON en este archivo")
+    return parser
+
+
+def run_merge(args, parser):
+    """Ejecutar el subcomando merge"""
+    if not args.output and not args.dry_run:
+        parser.error("merge: se necesita -o/--output salvo con --dry-run")
+    processor = ImageProcessor()
+    paths = expand_inputs(processor, args.inputs, args.recursive)
+    if not paths:
+        raise ValueError("No hay imágenes para combinar")
+    
+    if args.dedup:
+        unique, duplicates = find_duplicates(paths, near=args.dedup == "near")
+        if not args.quiet:
+            for duplicate in duplicates:
+                print(
+                    f"⚠️ Duplicado ({duplicate.kind}): {duplicate.path} = {duplicate.original}",
+                    file=sys.stderr,
+                )
+        if not args.keep_duplicates:
+            paths = unique
+    
+    output_paths = args.output or []
+    if len(output_paths) > 1 and args.format_name:
+        raise ValueError("Con varias salidas el formato se toma de cada extensión")
+    outputs = [
+        (path, resolve_format(path, args.format_name), args.quality) for path in output_paths
+    ]
+    max_bytes = args.max_kb * 1024 if args.max_kb else None
+    if max_bytes and not args.quiet and any(f not in ("JPEG", "WEBP") for _, f, _ in outputs):
+        print(
+            f"⚠️ --max-kb solo limita JPEG/WebP; el resto se guarda sin límite de tamaño "
+            f"(PNG con el perfil '{args.png_profile or 'smallest'}')",
+            file=sys.stderr,
+        )
+    timings = {}
+    
+    if args.dry_run or args.save_plan:
+        start = time.perf_counter()
+        plan = processor.plan_layout(
+            paths, args.mode, args.spacing, args.background,
+            args.max_dimension, layout_options(args)
+        )
+        elapsed = time.perf_counter() - start
+        if args.save_plan:
+            plan.save(args.save_plan)
+        if args.dry_run:
+            if not args.quiet:
+                print(
+                    f"{len(plan)} imágenes → {plan.canvas_size[0]} × {plan.canvas_size[1]} px "
+                    f"({plan.canvas_mode}), memoria estimada "
+                    f"{plan.estimate_bytes() / (1024 * 1024):.1f} MB, plan en {elapsed * 1000:.1f} ms"
+                )
+            return 0
+    
+    output_path, output_format, _ = outputs[0]
+    
+    def report(i, total):
+        if not args.quiet:
+            print(f"\rProcesando {i + 1}/{total}...", end="", file=sys.stderr, flush=True)
+    
+    saved = []
+    start = time.perf_counter()
+    if args.animated:
+        if len(outputs) > 1 or output_format not in ("GIF", "WEBP"):
+            raise ValueError("--animated solo admite una salida GIF o WebP")
+        animation = processor.merge_animated(
+            paths, output_path, args.mode, args.spacing, args.background,
+            output_format, args.quality, max_dimension=args.max_dimension,
+            progress_callback=report, layout_options=layout_options(args)
+        )
+        size = animation["size"]
+        if not args.quiet:
+            print(
+                f"\r{animation['frames']} fotogramas, {animation['duration_ms'] / 1000:.2f}s",
+                file=sys.stderr,
+            )
+    elif args.low_memory:
+        if len(outputs) > 1 or output_format != "PNG":
+            raise ValueError("--low-memory solo admite una salida PNG")
+        size = processor.combine_paths_to_png(
+            paths, output_path, args.mode, args.spacing, args.background,
+            progress_callback=report, max_dimension=args.max_dimension,
+            layout_options=layout_options(args), png_profile=args.png_profile
+        )
+    elif args.incremental:
+        from incremental import IncrementalMerger
+        
+        merger = IncrementalMerger(processor, keep_in_memory=False)
+        result, stats = merger.merge(
+            paths, output_path, args.mode, args.spacing, args.background,
+            max_dimension=args.max_dimension, progress_callback=report, timings=timings,
+            layout_options=layout_options(args)
+        )
+        size = result.size
+        
+        save_start = time.perf_counter()
+        saved = merger.save(
+            result, output_path, output_format, args.quality, args.png_profile,
+            extra_outputs=outputs[1:], max_bytes=max_bytes
+        )
+        timings["guardado"] = time.perf_counter() - save_start
+        if not args.quiet:
+            print(
+                f"\rReutilizadas {stats['reused']}, pegadas {stats['pasted']}",
+                file=sys.stderr,
+            )
+    else:
+        result = processor.merge_files(
+            paths, args.mode, args.spacing, args.background,
+            max_dimension=args.max_dimension, workers=args.workers,
+            progress_callback=report, timings=timings,
+            layout_options=layout_options(args)
+        )
+        size = result.size
+        
+        save_start = time.perf_counter()
+        saved = processor.save_outputs(result, outputs, args.png_profile, max_bytes=max_bytes)
+        timings["guardado"] = time.perf_counter() - save_start
+    timings["total"] = time.perf_counter() - start
+    
+    if not args.quiet:
+        stages = " · ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+        print(
+            f"\r{len(paths)} imágenes → {', '.join(args.output)} "
+            f"({size[0]} × {size[1]} px, {', '.join(f for _, f, _ in outputs)})\n{stages}",
+            file=sys.stderr,
+        )
+        for item in saved:
+            if "trials" in item:
+                print(
+                    f"{item['path']}: calidad {item['quality']}, "
+                    f"{item['bytes'] / 1024:.0f} KB, {item['trials']} pruebas"
+                    f"{'' if item['fits'] else ' (no cabe en el tamaño pedido)'}",
+                    file=sys.stderr,
+                )
+    return 0
+
+
+def run_compose(args):
+    """Ejecutar el subcomando compose"""
+    processor = ImageProcessor()
+    plan = LayoutPlan.load(args.plan)
+    output_format = resolve_format(args.output, args.format_name)
+    
+    def report(i, total):
+        if not args.quiet:
+            print(f"\rProcesando {i + 1}/{total}...", end="", file=sys.stderr, flush=True)
+    
+    if args.low_memory:
+        if output_format != "PNG":
+            raise ValueError("--low-memory solo admite salida PNG")
+        processor.write_plan_png(
+            plan, args.output, png_profile=args.png_profile, progress_callback=report
+        )
+    else:
+        result = processor.composite(plan, progress_callback=report)
+        processor.save_image(
+            result, args.output, output_format, args.quality, args.png_profile
+        )
+    
+    if not args.quiet:
+        print(
+            f"\r{len(plan)} imágenes → {args.output} "
+            f"({plan.canvas_size[0]} × {plan.canvas_size[1]} px, {output_format})",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def run_batch_command(args):
+    """Ejecutar el subcomando batch"""
+    # Importación diferida: batch importa este módulo
+    from batch import load_manifest, run_batch
+    
+    jobs = load_manifest(args.manifest)
+    budget = args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb else None
+    
+    def report(result, total):
+        if not args.quiet:
+            status = "✅" if result["status"] == "ok" else f"❌ {result.get('error', '')}"
+            print(f"[{result['id']}] {result['output']} {status}", file=sys.stderr)
+    
+    summary = run_batch(
+        jobs, concurrency=args.jobs, memory_budget=budget,
+        decode_workers=args.decode_workers, progress_callback=report
+    )
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    if not args.quiet:
+        print(
+            f"{summary['ok']}/{summary['total']} trabajos correctos "
+            f"en {summary['seconds']:.2f}s",
+            file=sys.stderr,
+        )
+    return 0 if summary["errors"] == 0 else 1
+
+
+def run_watch(args):
+    """Ejecutar el subcomando watch hasta Ctrl+C"""
+    from watcher import FolderMergeDaemon, create_watcher
+    
+    watcher = create_watcher(
+        args.folders, use_inotify=not args.no_inotify,
+        include_existing=args.include_existing
+    )
+    daemon = FolderMergeDaemon(
+        ImageProcessor(), watcher, args.output_dir,
+        mode=args.mode, spacing=args.spacing, background_color=args.background,
+        layout_options=layout_options(args),
+        output_format=resolve_format("", args.format_name), quality=args.quality,
+        png_profile=args.png_profile,
+        group_pattern=args.group_pattern, group_size=args.group_size,
+        idle_seconds=args.idle_seconds, poll_interval=args.poll_interval,
+    )
+    
+    print(
+        f"👀 Vigilando {', '.join(args.folders)} ({type(watcher).__name__}); Ctrl+C para salir",
+        file=sys.stderr,
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_bench_png(args):
+    """Ejecutar el subcomando bench-png"""
+    from benchmarks import benchmark_png_profiles, synthetic_screenshot
+    
+    if args.inputs:
+        samples = [(path, Image.open(path)) for path in args.inputs]
+    else:
+        # Una página larga de capturas apiladas, como una combinación vertical típica
+        page = Image.new("RGB", (1920, 1080 * 4))
+        for i in range(4):
+            page.paste(synthetic_screenshot(seed=i), (0, 1080 * i))
+        samples = [("sintética 1920×4320 RGB", page), ("sintética 1920×4320 RGBA", page.convert("RGBA"))]
+    
+    report = []
+    for name, image in samples:
+        image.load()
+        print(f"{name} ({image.width} × {image.height}, {image.mode})")
+        for result in benchmark_png_profiles(image, repeat=args.repeat):
+            print(
+                f"  {result['profile']:<9} {result['seconds']:7.3f}s "
+                f"{result['mp_per_second']:7.1f} MP/s {result['bytes'] / 1024:10.0f} KB"
+            )
+            report.append(dict(result, image=name))
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+def run_bench(args):
+    """Ejecutar el subcomando bench"""
+    from benchmarks import run_benchmarks
+    
+    def report(corpus, stage, variant):
+        print(f"\r{corpus}: {stage} {variant}...".ljust(60), end="", file=sys.stderr, flush=True)
+    
+    summary = run_benchmarks(
+        args.corpus, scale=args.scale, repeat=args.repeat,
+        work_dir=args.work_dir, progress_callback=report
+    )
+    print("\r".ljust(61), end="\r", file=sys.stderr)
+    
+    for name, corpus in summary["corpora"].items():
+        print(f"{name} ({corpus['files']} imágenes, {corpus['megapixels']:.1f} MP)")
+        for result in summary["results"]:
+            if result["corpus"] != name:
+                continue
+            label = f"  {result['stage']:<9} {result['variant']:<10}"
+            if "error" in result:
+                print(f"{label} ❌ {result['error']}")
+                continue
+            peak = result["peak_rss_bytes"]
+            print(
+                f"{label} {result['seconds']:8.3f}s {result['mp_per_second']:8.1f} MP/s "
+                f"{peak / (1024 * 1024) if peak else 0:8.0f} MB pico"
+            )
+    
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.command == "merge":
+            return run_merge(args, parser)
+        if args.command == "compose":
+            return run_compose(args)
+        if args.command == "batch":
+            return run_batch_command(args)
+        if args.command == "watch":
+            return run_watch(args)
+        if args.command == "bench-png":
+            return run_bench_png(args)
+        if args.command == "bench":
+            return run_bench(args)
+    except Exception as e:
+        print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
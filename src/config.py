@@ -3,6 +3,7 @@ Configuración de la aplicación Fusion
 """
 
 import os
+import zlib
 
 # Configuración de la aplicación
 APP_CONFIG = {
@@ -21,6 +22,82 @@ APP_CONFIG = {
     "default_spacing": 0,
     "default_background": "#FFFFFF",
     
+    # Perfiles de codificación PNG: nivel de zlib, estrategia de zlib
+    # (`compress_type`; sin ella Pillow usa Z_FILTERED, que engorda capturas y
+    # transparencias) y `optimize`, que elige el filtro de cada fila. Un perfil
+    # con una lista de alternativas las prueba todas y se queda con el archivo
+    # más pequeño: según `bench-png` ninguna opción sola gana en capturas,
+    # transparencias y fotos a la vez
+    "png_profile": "balanced",
+    "png_profiles": {
+        "fast": {"compress_level": 1},
+        "balanced": {"compress_level": 6, "compress_type": zlib.Z_DEFAULT_STRATEGY},
+        "smallest": [
+            {"compress_level": 3, "compress_type": zlib.Z_DEFAULT_STRATEGY},  # capturas RGB
+            {"compress_level": 8, "compress_type": zlib.Z_DEFAULT_STRATEGY},  # alfa y grises
+            {"compress_level": 2, "compress_type": zlib.Z_RLE, "optimize": True},  # fotos
+        ],
+    },
+    
+    # Exportación a varios formatos a la vez
+    "export_workers": None,          # hilos al guardar (None = uno por salida)
+    
+    # Codificación con tamaño máximo (JPEG/WebP)
+    "target_size_kb": 500,
+    "target_size_min_quality": 10,
+    "target_size_max_quality": 95,
+    "target_size_workers": 4,              # codificaciones de prueba en paralelo
+    "target_size_probe_pixels": 1000000,   # por encima, se estima con una versión reducida
+    
+    # Decodificación en paralelo (None = número de núcleos)
+    "decode_workers": None,
+    "decode_executor": "thread",      # "thread" o "process"
+    "decode_max_in_flight": None,     # None = 2 por worker
+    "header_cache_items": 10000,      # dimensiones leídas de cabeceras
+    "decoded_cache_mb": 512,          # imágenes decodificadas en la GUI
+    
+    # Re-combinación incremental: por encima de esta fracción de imágenes
+    # cambiadas se rehace el resultado completo
+    "incremental_max_changed_ratio": 0.5,
+    "incremental_manifest_max_files": 200,   # manifiestos en la caché de la GUI
+    
+    # Duplicados: distancia máxima del hash perceptual para "casi iguales"
+    "dedup_max_distance": 4,
+    "dedup_max_aspect_diff": 0.02,   # diferencia relativa de proporciones admitida
+    "dedup_workers": 4,
+    
+    # Miniaturas de la lista de imágenes
+    "thumbnail_size": (60, 45),
+    "thumbnail_workers": 2,
+    "thumbnail_cache_items": 2000,
+    "thumbnail_disk_cache": True,
+    "thumbnail_disk_cache_mb": 64,
+    
+    # Lista virtualizada: solo se crean widgets para las filas visibles
+    "virtual_list": True,
+    "list_row_height": 52,
+    "list_overscan_rows": 4,
+    
+    # Cuadrícula: columnas o filas (None = 2 columnas) y ajuste de celdas
+    # ("uniform": todas del tamaño de la mayor, "rowcol": por fila y columna)
+    "grid_columns": None,
+    "grid_rows": None,
+    "grid_cell_sizing": "uniform",
+    
+    # Combinación animada (GIF/WebP)
+    "animation_min_frame_ms": 20,       # cortes más próximos se fusionan
+    "animation_default_frame_ms": 100,  # fotogramas sin duración
+    "animation_loop": 0,                # repeticiones (0 = siempre)
+    
+    # Vista previa de la combinación
+    "preview_height": 150,
+    "preview_delay_ms": 30,          # espera para agrupar cambios seguidos
+    "preview_proxy_size": (256, 256),
+    "preview_cache_items": 300,
+    
+    # Intervalo de refresco del indicador de memoria (ms)
+    "memory_readout_ms": 2000,
+    
     # Colores de la interfaz
     "colors": {
         "primary": "#3B82F6",      # Azul
@@ -39,4 +116,12 @@ def get_base_path():
 
 def get_asset_path(filename):
     """Obtener ruta completa de un asset"""
-    return os.path.join(get_base_path(), "assets", filename)
\ No newline at end of file
+    return os.path.join(get_base_path(), "assets", filename)
+
+def get_cache_dir():
+    """Obtener la carpeta de caché del usuario para la aplicación"""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ops_imagen_fusion")
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Caché en memoria de imágenes ya decodificadas entre combinaciones sucesivas
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class DecodedImageCache:
+    """Caché LRU de imágenes decodificadas con presupuesto en bytes
+    
+    La clave es (ruta, mtime, tamaño de archivo, modo, tamaño de entrega), así
+    que un archivo modificado o pedido a otra escala nunca devuelve una imagen
+    vieja. Las imágenes guardadas se comparten: quien las reciba no debe
+    modificarlas ni cerrarlas.
+    """
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __getstate__(self):
+        # En otro proceso la caché empieza vacía (no se copian imágenes)
+        return {"max_bytes": self.max_bytes}
+    
+    def __setstate__(self, state):
+        self.__init__(state["max_bytes"])
+    
+    def __len__(self):
+        return len(self._items)
+    
+    @staticmethod
+    def image_bytes(image):
+        """Memoria aproximada de los píxeles de una imagen"""
+        return image.width * image.height * len(image.getbands())
+    
+    @staticmethod
+    def make_key(file_path, mode, target_size=None):
+        """Clave de caché de un archivo decodificado a un modo y tamaño"""
+        stat = os.stat(file_path)
+        return (
+            os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size,
+            mode, tuple(target_size) if target_size else None,
+        )
+    
+    def get(self, key):
+        """Obtener una imagen y marcarla como usada recientemente"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, image):
+        """Guardar una imagen descartando las menos usadas hasta que quepa"""
+        size = self.image_bytes(image)
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            
+            while self._items and self.current_bytes + size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.current_bytes -= evicted
+            
+            self._items[key] = (image, size)
+            self.current_bytes += size
+    
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
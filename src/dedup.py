@@ -0,0 +1,123 @@
+"""
+Detección de imágenes duplicadas antes de combinar
+
+Los duplicados exactos se detectan por hash del contenido del archivo (xxhash
+si está instalado, blake2b si no), leído por bloques y solo entre archivos del
+mismo tamaño. Opcionalmente se detectan casi duplicados con un hash perceptual
+(dHash de 64 bits) calculado sobre una vista previa pequeña; además del hash
+deben coincidir las proporciones, porque el dHash de dos imágenes lisas es el
+mismo aunque no se parezcan.
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config import APP_CONFIG
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+Duplicate = namedtuple("Duplicate", "path original kind distance")
+
+
+def file_digest(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """Hash del contenido completo de un archivo leído por bloques"""
+    digest = xxhash.xxh3_128() if xxhash else hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(file_path, hash_size=8):
+    """dHash: compara píxeles vecinos de una versión gris de (hash_size+1)×hash_size"""
+    with Image.open(file_path) as image:
+        if image.format == "JPEG":
+            image.draft("L", (hash_size * 4, hash_size * 4))
+        small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def similar_aspect(size, other, tolerance=None):
+    """Indicar si dos tamaños (ancho, alto) tienen casi la misma proporción"""
+    if tolerance is None:
+        tolerance = APP_CONFIG["dedup_max_aspect_diff"]
+    a, b = size[0] * other[1], other[0] * size[1]
+    return abs(a - b) <= tolerance * max(a, b)
+
+
+def find_duplicates(file_paths, near=False, max_distance=None, workers=None):
+    """Separar las rutas únicas de los duplicados, conservando el primer aparecido
+    
+    Devuelve (únicas, duplicados) donde cada duplicado indica su original,
+    el tipo ("exact" o "near") y la distancia de Hamming del hash perceptual.
+    """
+    if max_distance is None:
+        max_distance = APP_CONFIG["dedup_max_distance"]
+    workers = workers or APP_CONFIG["dedup_workers"]
+    
+    # Solo pueden ser idénticos los archivos con el mismo tamaño en disco
+    by_size = {}
+    for path in file_paths:
+        by_size.setdefault(os.path.getsize(path), []).append(path)
+    candidates = sorted({p for group in by_size.values() if len(group) > 1 for p in group})
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = dict(zip(candidates, pool.map(file_digest, candidates)))
+    
+    unique = []
+    duplicates = []
+    seen = {}
+    for path in file_paths:
+        digest = digests.get(path)
+        if digest is not None and digest in seen:
+            duplicates.append(Duplicate(path, seen[digest], "exact", 0))
+            continue
+        if digest is not None:
+            seen[digest] = path
+        unique.append(path)
+    
+    if not near or len(unique) < 2:
+        return unique, duplicates
+    
+    def safe_signature(path):
+        try:
+            with Image.open(path) as image:
+                size = image.size
+            return size, perceptual_hash(path)
+        except Exception:
+            return None
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        signatures = list(pool.map(safe_signature, unique))
+    
+    kept = []
+    for path, signature in zip(unique, signatures):
+        match = None
+        if signature is not None:
+            for kept_path, kept_signature in kept:
+                if kept_signature is None or not similar_aspect(signature[0], kept_signature[0]):
+                    continue
+                distance = bin(signature[1] ^ kept_signature[1]).count("1")
+                if distance <= max_distance:
+                    match = (kept_path, distance)
+                    break
+        if match:
+            duplicates.append(Duplicate(path, match[0], "near", match[1]))
+        else:
+            kept.append((path, signature))
+    
+    return [path for path, _ in kept], duplicates
@@ -0,0 +1,106 @@
+"""
+Escritor GIF animado fotograma a fotograma
+
+El codificador GIF de Pillow reúne todos los fotogramas antes de escribir el
+archivo. Aquí cada fotograma se codifica con Pillow como un GIF suelto y se
+copia a la salida con su paleta como tabla de color local, así que en memoria
+solo está el fotograma en curso.
+"""
+
+import io
+import struct
+
+
+def _skip_sub_blocks(data, pos):
+    """Posición siguiente a una secuencia de sub-bloques terminada en 0"""
+    while data[pos]:
+        pos += data[pos] + 1
+    return pos + 1
+
+
+def _encode_frame(frame):
+    """Codificar un fotograma como GIF suelto y extraer sus partes
+    
+    Devuelve (tabla de color, bits de tamaño de la tabla, índice
+    transparente o None, entrelazado, datos LZW con su terminador).
+    """
+    buffer = io.BytesIO()
+    frame.save(buffer, "GIF")
+    data = buffer.getvalue()
+    
+    packed = data[10]
+    pos = 13
+    color_table, table_bits = b"", 0
+    if packed & 0x80:
+        table_bits = packed & 7
+        table_size = 3 << (table_bits + 1)
+        color_table = data[pos:pos + table_size]
+        pos += table_size
+    
+    transparency = None
+    while data[pos] == 0x21:
+        # Extensión de control gráfico: el bit 0 indica índice transparente
+        if data[pos + 1] == 0xF9 and data[pos + 3] & 1:
+            transparency = data[pos + 6]
+        pos = _skip_sub_blocks(data, pos + 2)
+    
+    if data[pos] != 0x2C:
+        raise ValueError("El fotograma GIF no tiene descriptor de imagen")
+    flags = data[pos + 9]
+    pos += 10
+    if flags & 0x80:
+        table_bits = flags & 7
+        table_size = 3 << (table_bits + 1)
+        color_table = data[pos:pos + table_size]
+        pos += table_size
+    if not color_table:
+        raise ValueError("El fotograma GIF no tiene paleta")
+    
+    # Tamaño mínimo de código LZW seguido de los sub-bloques de datos
+    end = _skip_sub_blocks(data, pos + 1)
+    return color_table, table_bits, transparency, flags & 0x40, data[pos:end]
+
+
+def write_gif_frames(file_path, size, frames, durations, loop=0):
+    """Escribir un GIF animado a partir de un generador de fotogramas
+    
+    Cada fotograma es una imagen de Pillow del tamaño del lienzo y se escribe
+    en cuanto llega, con su propia paleta. `durations` da los milisegundos de
+    cada fotograma; los retardos se redondean a centésimas sobre el tiempo
+    acumulado para que el error no crezca con la longitud. Devuelve el número
+    de fotogramas escritos.
+    """
+    width, height = size
+    elapsed = 0
+    count = 0
+    
+    with open(file_path, "wb") as stream:
+        # Cabecera sin tabla de color global
+        stream.write(b"GIF89a" + struct.pack("<HHBBB", width, height, 0, 0, 0))
+        # Extensión NETSCAPE2.0: número de repeticiones (0 = siempre)
+        stream.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+        
+        for frame, duration in zip(frames, durations):
+            if frame.size != (width, height):
+                raise ValueError("El fotograma no coincide con el lienzo")
+            
+            color_table, table_bits, transparency, interlace, image_data = _encode_frame(frame)
+            delay = round((elapsed + duration) / 10) - round(elapsed / 10)
+            elapsed += duration
+            
+            # Con transparencia se restaura el fondo para no ver el fotograma anterior
+            disposal = 2 if transparency is not None else 1
+            stream.write(b"!\xf9\x04" + struct.pack(
+                "<BHBB", disposal << 2 | (transparency is not None),
+                delay, transparency or 0, 0
+            ))
+            stream.write(b"," + struct.pack(
+                "<HHHHB", 0, 0, width, height, 0x80 | interlace | table_bits
+            ))
+            stream.write(color_table)
+            stream.write(image_data)
+            count += 1
+        
+        stream.write(b";")
+    
+    return count
@@ -7,126 +7,84 @@ from tkinter import ttk, filedialog, messagebox
 import os
 from PIL import Image, ImageTk
 import threading
+import time
+from image_processor import ImageProcessor as BaseImageProcessor
+from thumbnails import ThumbnailLoader, ThumbnailCache
+from incremental import IncrementalMerger
+from scanner import scan_folder
+from dedup import find_duplicates
+from config import APP_CONFIG, get_cache_dir
+from memory_usage import get_rss_bytes
+from utils import format_file_size
 
-class ImageProcessor:
-    """Clase completa de procesamiento de imágenes"""
+class ImageProcessor(BaseImageProcessor):
+    """Procesador de imágenes con las utilidades propias de la interfaz"""
     
     def __init__(self):
+        # Las re-combinaciones tras cambiar opciones reutilizan lo decodificado
+        super().__init__(decoded_cache_bytes=APP_CONFIG["decoded_cache_mb"] * 1024 * 1024)
         self.supported_formats = [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"]
     
-    def validate_image(self, file_path):
-        """Validar si un archivo es una imagen soportada"""
-        try:
-            ext = os.path.splitext(file_path)[1].lower()
-            return ext in self.supported_formats
-        except:
-            return False
-    
-    def open_image(self, file_path):
-        """Abrir una imagen y convertir a RGB"""
-        try:
-            image = Image.open(file_path)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            return image
-        except Exception as e:
-            raise Exception(f"Error al abrir la imagen {file_path}: {str(e)}")
-    
     def create_thumbnail(self, image_path, size=(60, 45)):
         """Crear miniatura para preview"""
         try:
-            image = Image.open(image_path)
-            image.thumbnail(size, Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(image)
+            return ImageTk.PhotoImage(self.load_thumbnail(image_path, size))
         except:
             placeholder = Image.new('RGB', size, color='lightgray')
             return ImageTk.PhotoImage(placeholder)
+
+class PhotoImagePool:
+    """PhotoImages de miniaturas compartidos por ruta con conteo de referencias
     
-    def combine_images_vertical(self, images, spacing=0, background_color="#FFFFFF"):
-        """Combinar imágenes verticalmente"""
-        if not images:
-            raise ValueError("No hay imágenes para combinar")
-        
-        max_width = max(img.width for img in images)
-        total_height = sum(img.height for img in images) + (spacing * (len(images) - 1))
-        
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (max_width, total_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (max_width, total_height), background_color)
-        
-        y_offset = 0
-        for img in images:
-            x_offset = (max_width - img.width) // 2
-            result.paste(img, (x_offset, y_offset))
-            y_offset += img.height + spacing
-        
-        return result
+    Cada fila que muestra una ruta adquiere su PhotoImage y lo libera al
+    cambiar de ruta o destruirse; al llegar a cero referencias se descarta,
+    así que el pool nunca crece más que las filas existentes.
+    """
     
-    def combine_images_horizontal(self, images, spacing=0, background_color="#FFFFFF"):
-        """Combinar imágenes horizontalmente"""
-        if not images:
-            raise ValueError("No hay imágenes para combinar")
-        
-        total_width = sum(img.width for img in images) + (spacing * (len(images) - 1))
-        max_height = max(img.height for img in images)
-        
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (total_width, max_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (total_width, max_height), background_color)
-        
-        x_offset = 0
-        for img in images:
-            y_offset = (max_height - img.height) // 2
-            result.paste(img, (x_offset, y_offset))
-            x_offset += img.width + spacing
-        
-        return result
+    def __init__(self):
+        self._photos = {}
     
-    def combine_images_grid(self, images, spacing=0, background_color="#FFFFFF"):
-        """Combinar imágenes en cuadrícula"""
-        if not images:
-            raise ValueError("No hay imágenes para combinar")
-        
-        cols = 2
-        rows = (len(images) + cols - 1) // cols
-        
-        max_width = max(img.width for img in images)
-        max_height = max(img.height for img in images)
-        
-        total_width = (max_width * cols) + (spacing * (cols - 1))
-        total_height = (max_height * rows) + (spacing * (rows - 1))
-        
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (total_width, total_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (total_width, total_height), background_color)
-        
-        for i, img in enumerate(images):
-            row = i // cols
-            col = i % cols
-            
-            x_offset = col * (max_width + spacing)
-            y_offset = row * (max_height + spacing)
-            
-            x_center = x_offset + (max_width - img.width) // 2
-            y_center = y_offset + (max_height - img.height) // 2
-            
-            result.paste(img, (x_center, y_center))
-        
-        return result
+    def __len__(self):
+        return len(self._photos)
     
-    def save_image(self, image, file_path, format="PNG", quality=95):
-        """Guardar imagen en el formato especificado"""
-        try:
-            if format.upper() == "PNG" and image.mode == 'RGBA':
-                image.save(file_path, format.upper(), compress_level=9)
-            else:
-                image.save(file_path, format.upper(), quality=quality)
-            return True
-        except Exception as e:
-            raise Exception(f"Error al guardar la imagen: {str(e)}")
+    def __contains__(self, path):
+        return path in self._photos
+    
+    def acquire(self, path, image=None):
+        """Obtener el PhotoImage de una ruta, creándolo desde `image` si hace falta"""
+        entry = self._photos.get(path)
+        if entry is None:
+            entry = self._photos[path] = [ImageTk.PhotoImage(image), 0]
+        entry[1] += 1
+        return entry[0]
+    
+    def release(self, path):
+        """Soltar una referencia y descartar el PhotoImage si ya no se usa"""
+        entry = self._photos.get(path)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._photos[path]
+    
+    def clear(self):
+        """Descartar todos los PhotoImages"""
+        self._photos.clear()
+
+
+class ImageRow:
+    """Widgets de una fila de la lista y la ruta que muestran"""
+    
+    def __init__(self, frame, thumb_label, name_label, index_label, index):
+        self.frame = frame
+        self.thumb_label = thumb_label
+        self.name_label = name_label
+        self.index_label = index_label
+        self.index = index
+        self.path = None
+        self.window = None
+        self.photo_path = None
+
 
 class MainWindow:
     """Ventana principal de la aplicación - INTERFAZ COMPACTA"""
@@ -135,10 +93,35 @@ class MainWindow:
         self.root = root
         self.processor = ImageProcessor()
         self.image_paths = []
-        self.thumbnails = []
+        self.image_rows = []
+        self.empty_state = None
+        self.virtual_list = APP_CONFIG["virtual_list"]
+        self.row_height = APP_CONFIG["list_row_height"]
+        self.photo_pool = PhotoImagePool()
+        # Sin retener el lienzo entre guardados y con los manifiestos en la
+        # caché de la aplicación, no junto a los archivos del usuario
+        self.incremental = IncrementalMerger(
+            self.processor, keep_in_memory=False,
+            manifest_dir=os.path.join(get_cache_dir(), "layouts")
+        )
+        
+        # Miniaturas generadas en segundo plano y entregadas con root.after
+        self.thumbnail_loader = ThumbnailLoader(
+            self.processor, lambda fn: self.root.after(0, fn)
+        )
+        # Proxies reducidos para la vista previa, solo en memoria
+        self.preview_loader = ThumbnailLoader(
+            self.processor, lambda fn: self.root.after(0, fn),
+            size=APP_CONFIG["preview_proxy_size"], disk_cache=False,
+            cache=ThumbnailCache(APP_CONFIG["preview_cache_items"])
+        )
+        self.placeholder_thumbnail = ImageTk.PhotoImage(
+            Image.new('RGB', APP_CONFIG["thumbnail_size"], color='lightgray')
+        )
         
         self.setup_ui()
         self.setup_styles()
+        self.update_memory_readout()
     
     def setup_styles(self):
         """Configurar estilos visuales"""
@@ -169,6 +152,7 @@ class MainWindow:
         left_column.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
         
         self.create_image_section(left_column)
+        self.create_preview_section(left_column)
         
         # COLUMNA DERECHA: Opciones y controles
         right_column = ttk.Frame(content_frame)
@@ -190,7 +174,7 @@ class MainWindow:
         # Título e ícono
         title_frame = ttk.Frame(content)
         title_frame.pack(side=tk.LEFT, fill=tk.X, expand=True)
-
+        
         title_row = ttk.Frame(title_frame)
         title_row.pack(anchor="w")
         icon_label = ttk.Label(title_row)
@@ -202,7 +186,7 @@ class MainWindow:
             text="Ops Imagen-Fusion",
             style="Title.TLabel"
         ).pack(side=tk.LEFT, padx=5)
-
+        
         ttk.Label(
     
     text="Combinador de imágenes - Área de Operaciones",
@@ -256,16 +240,22 @@ class MainWindow:
         
         # Canvas con scroll
         self.canvas = tk.Canvas(list_frame, bg="white")
-        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.canvas.yview)
+        self.list_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.canvas.yview)
+        scrollbar = self.list_scrollbar
         self.scrollable_frame = ttk.Frame(self.canvas, style="Modern.TFrame")
         
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
-        
         self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        
+        if self.virtual_list:
+            # Las filas se reciclan al hacer scroll o cambiar el tamaño
+            self.canvas.configure(yscrollcommand=self.on_list_scroll)
+            self.canvas.bind("<Configure>", lambda e: self.render_visible_rows())
+        else:
+            self.scrollable_frame.bind(
+                "<Configure>",
+                lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+            )
+            self.canvas.configure(yscrollcommand=scrollbar.set)
         
         self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
@@ -273,6 +263,24 @@ class MainWindow:
         # Estado vacío
         self.show_empty_state()
     
+    def create_preview_section(self, parent):
+        """Crear la vista previa de la combinación (izquierda, bajo la lista)"""
+        preview_frame = ttk.LabelFrame(parent, text=" 👁️ Vista previa ", padding="5")
+        preview_frame.pack(fill=tk.X, pady=5)
+        
+        self.preview_canvas = tk.Canvas(
+            preview_frame, bg="white", highlightthickness=0,
+            height=APP_CONFIG["preview_height"]
+        )
+        self.preview_canvas.pack(fill=tk.X)
+        self.preview_canvas.bind("<Configure>", lambda e: self.schedule_preview())
+        
+        self.info_label = ttk.Label(preview_frame, font=("Arial", 8), foreground="#7f8c8d")
+        self.info_label.pack(anchor="w", pady=(3, 0))
+        
+        self.preview_photo = None
+        self.preview_job = None
+    
     def create_controls_section(self, parent):
         """Crear sección de controles (derecha)"""
         parent.config(width=350)
@@ -285,17 +293,42 @@ class MainWindow:
         
         ttk.Radiobutton(
             disp_frame, text="⬇️ Vertical",
-            variable=self.combination_mode, value="vertical"
+            variable=self.combination_mode, value="vertical",
+            command=self.update_info
         ).pack(anchor="w", pady=2)
         
         ttk.Radiobutton(
             disp_frame, text="➡️ Horizontal",
-            variable=self.combination_mode, value="horizontal"
+            variable=self.combination_mode, value="horizontal",
+            command=self.update_info
         ).pack(anchor="w", pady=2)
         
         ttk.Radiobutton(
             disp_frame, text="🔲 Cuadrícula",
-            variable=self.combination_mode, value="grid"
+            variable=self.combination_mode, value="grid",
+            command=self.update_info
+        ).pack(anchor="w", pady=2)
+        
+        grid_options = ttk.Frame(disp_frame)
+        grid_options.pack(fill=tk.X, padx=(20, 0))
+        
+        ttk.Label(grid_options, text="Columnas:", font=("Arial", 8)).pack(side=tk.LEFT)
+        self.grid_columns_var = tk.StringVar(value="2")
+        ttk.Spinbox(
+            grid_options, from_=1, to=50, width=4, textvariable=self.grid_columns_var
+        ).pack(side=tk.LEFT, padx=(3, 8))
+        self.grid_columns_var.trace_add("write", lambda *args: self.update_info())
+        
+        self.grid_fit_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            grid_options, text="Celdas ajustadas",
+            variable=self.grid_fit_var, command=self.update_info
+        ).pack(side=tk.LEFT)
+        
+        ttk.Radiobutton(
+            disp_frame, text="📦 Empaquetado (mínima área)",
+            variable=self.combination_mode, value="packed",
+            command=self.update_info
         ).pack(anchor="w", pady=2)
         
         # ESPACIADO
@@ -331,6 +364,7 @@ class MainWindow:
             width=18
         )
         bg_combo.pack(fill=tk.X)
+        bg_combo.bind("<<ComboboxSelected>>", lambda e: self.update_info())
         
         # FORMATO Y CALIDAD
         output_frame = ttk.LabelFrame(parent, text=" 💾 Formato de Salida ", padding="10")
@@ -374,21 +408,85 @@ class MainWindow:
         self.quality_label = ttk.Label(quality_control, text="95%", width=4)
         self.quality_label.pack(side=tk.RIGHT, padx=5)
         
+        # Compresión PNG (sin efecto en JPEG/WebP)
+        ttk.Label(output_frame, text="Compresión PNG:", font=("Arial", 9)).pack(anchor="w", pady=(8, 2))
+        
+        self.png_profiles = {
+            "Rápida": "fast",
+            "Equilibrada": "balanced",
+            "Mínimo tamaño": "smallest",
+        }
+        self.png_profile_var = tk.StringVar(value="Equilibrada")
+        ttk.Combobox(
+            output_frame,
+            textvariable=self.png_profile_var,
+            values=list(self.png_profiles),
+            state="readonly",
+            width=18
+        ).pack(fill=tk.X)
+        
+        # Tamaño máximo del resultado
+        ttk.Label(output_frame, text="Lado máximo:", font=("Arial", 9)).pack(anchor="w", pady=(8, 2))
+        
+        self.max_dimension_var = tk.StringVar(value="Original")
+        ttk.Combobox(
+            output_frame,
+            textvariable=self.max_dimension_var,
+            values=["Original", "8000", "4000", "2000", "1000"],
+            state="readonly",
+            width=18
+        ).pack(fill=tk.X)
+        
         # OPCIONES ADICIONALES
         opts_frame = ttk.LabelFrame(parent, text=" 🔧 Opciones ", padding="10")
         opts_frame.pack(fill=tk.X, pady=5)
         
+        # Comprimir: JPEG/WebP buscan la mejor calidad bajo el tamaño indicado
+        compress_row = ttk.Frame(opts_frame)
+        compress_row.pack(fill=tk.X, pady=2)
+        
         self.compress_var = tk.BooleanVar(value=False)
         ttk.Checkbutton(
-            opts_frame, text="Comprimir imagen",
+            compress_row, text="Comprimir hasta",
             variable=self.compress_var
-        ).pack(anchor="w", pady=2)
+        ).pack(side=tk.LEFT)
+        
+        self.target_kb_var = tk.StringVar(value=str(APP_CONFIG["target_size_kb"]))
+        ttk.Spinbox(
+            compress_row, from_=10, to=100000, increment=50, width=7,
+            textvariable=self.target_kb_var
+        ).pack(side=tk.LEFT, padx=3)
+        ttk.Label(compress_row, text="KB").pack(side=tk.LEFT)
         
         self.keep_meta_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(
             opts_frame, text="Mantener metadatos",
             variable=self.keep_meta_var
         ).pack(anchor="w", pady=2)
+        
+        self.dedup_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            opts_frame, text="Omitir duplicados",
+            variable=self.dedup_var
+        ).pack(anchor="w", pady=2)
+        
+        self.dedup_near_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            opts_frame, text="Incluir casi idénticas",
+            variable=self.dedup_near_var
+        ).pack(anchor="w", pady=2)
+        
+        self.export_all_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            opts_frame, text="Guardar también en los otros formatos",
+            variable=self.export_all_var
+        ).pack(anchor="w", pady=2)
+        
+        self.low_memory_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            opts_frame, text="PNG por franjas (bajo consumo)",
+            variable=self.low_memory_var
+        ).pack(anchor="w", pady=2)
     
     def create_compact_footer(self, parent):
         """Crear pie de página compacto"""
@@ -413,6 +511,14 @@ class MainWindow:
         self.progress_bar.pack(fill=tk.X, pady=2)
         self.progress_frame.pack_forget()
         
+        # Indicador de memoria
+        self.memory_label = ttk.Label(
+            footer_frame,
+            font=("Arial", 7),
+            foreground="#7f8c8d"
+        )
+        self.memory_label.pack(anchor="e", padx=10)
+        
         # Botón principal
         self.merge_button = ttk.Button(
             footer_frame,
@@ -423,11 +529,9 @@ class MainWindow:
     
     def show_empty_state(self):
         """Mostrar estado vacío"""
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-        
         empty = ttk.Frame(self.scrollable_frame)
         empty.pack(fill=tk.BOTH, expand=True, pady=50)
+        self.empty_state = empty
         
         ttk.Label(
             empty,
@@ -483,12 +587,11 @@ class MainWindow:
         """Seleccionar carpeta"""
         folder = filedialog.askdirectory(title="Seleccionar carpeta")
         if folder:
-            image_files = []
-            for ext in self.processor.supported_formats:
-                image_files.extend([
-                    os.path.join(folder, f) for f in os.listdir(folder)
-                    if f.lower().endswith(ext)
-                ])
+            # Una sola pasada; las cabeceras quedan en la caché del procesador
+            index = scan_folder(
+                folder, self.processor.supported_formats, processor=self.processor
+            )
+            image_files = index.paths()
             
             if image_files:
                 self.add_images(image_files)
@@ -508,98 +611,247 @@ class MainWindow:
         self.update_info()
     
     def update_image_list(self):
-        """Actualizar lista de imágenes"""
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+        """Sincronizar la lista de widgets con image_paths reutilizando filas
+        
+        Solo se crean filas para rutas nuevas, se destruyen las sobrantes y se
+        reconfiguran las que cambian de ruta; las demás no se tocan.
+        """
+        if self.virtual_list:
+            self.render_visible_rows()
+            self.refresh_list_state()
+            return
         
         if not self.image_paths:
-            self.show_empty_state()
-            self.counter_label.config(text="0 imágenes")
+            while self.image_rows:
+                self.destroy_row(self.image_rows.pop())
+            self.refresh_list_state()
             return
         
+        while len(self.image_rows) > len(self.image_paths):
+            self.destroy_row(self.image_rows.pop())
+        
         for i, path in enumerate(self.image_paths):
-            self.create_image_item(path, i)
+            if i < len(self.image_rows):
+                self.set_row_path(self.image_rows[i], path)
+            else:
+                self.image_rows.append(self.create_image_item(path, i))
         
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self.refresh_list_state()
+    
+    def refresh_list_state(self):
+        """Actualizar contador, estado vacío y zona de scroll"""
+        if not self.image_paths:
+            if self.empty_state is None:
+                self.show_empty_state()
+            self.counter_label.config(text="0 imágenes")
+            return
+        
+        if self.empty_state is not None:
+            self.empty_state.destroy()
+            self.empty_state = None
+        
+        if self.virtual_list:
+            height = len(self.image_paths) * self.row_height
+            self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+        else:
+            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.counter_label.config(text=f"{len(self.image_paths)} imágenes")
     
+    def on_list_scroll(self, first, last):
+        """Mover la barra de scroll y reciclar las filas visibles"""
+        self.list_scrollbar.set(first, last)
+        self.render_visible_rows()
+    
+    def render_visible_rows(self):
+        """Asignar las filas del pool a las imágenes visibles (más un margen)
+        
+        Solo existen widgets para la ventana visible más `list_overscan_rows`
+        filas por encima y por debajo; al hacer scroll se reutilizan las mismas
+        filas cambiando la ruta que muestran y su posición en el canvas.
+        """
+        if not self.virtual_list:
+            return
+        
+        overscan = APP_CONFIG["list_overscan_rows"]
+        top = self.canvas.canvasy(0)
+        viewport = max(self.canvas.winfo_height(), self.row_height)
+        count = len(self.image_paths)
+        
+        first = max(0, int(top // self.row_height) - overscan)
+        last = min(count, int((top + viewport) // self.row_height) + 1 + overscan)
+        
+        while len(self.image_rows) < last - first:
+            index = first + len(self.image_rows)
+            self.image_rows.append(self.create_image_item(self.image_paths[index], index))
+        
+        width = self.canvas.winfo_width()
+        for offset, row in enumerate(self.image_rows):
+            index = first + offset
+            if index >= last:
+                # Fila sobrante: se oculta y devuelve su miniatura al pool
+                self.canvas.itemconfigure(row.window, state="hidden")
+                self.release_row_photo(row)
+                row.path = None
+                continue
+            
+            if row.index != index:
+                row.index = index
+                row.index_label.config(text=f"#{index + 1}")
+            self.set_row_path(row, self.image_paths[index])
+            self.canvas.coords(row.window, 0, index * self.row_height)
+            self.canvas.itemconfigure(row.window, state="normal", width=width)
+    
     def create_image_item(self, image_path, index):
         """Crear item de imagen compacto"""
-        item = ttk.Frame(self.scrollable_frame, relief="solid", borderwidth=1)
-        item.pack(fill=tk.X, pady=1, padx=2)
-        
-        # Miniatura
-        thumb = self.processor.create_thumbnail(image_path)
-        self.thumbnails.append(thumb)
+        if self.virtual_list:
+            # La fila vive en el canvas y se posiciona como ventana
+            item = ttk.Frame(self.canvas, relief="solid", borderwidth=1)
+        else:
+            item = ttk.Frame(self.scrollable_frame, relief="solid", borderwidth=1)
+            item.pack(fill=tk.X, pady=1, padx=2)
         
-        thumb_label = ttk.Label(item, image=thumb)
+        # Miniatura (se muestra un placeholder hasta que llega la real)
+        thumb_label = ttk.Label(item, image=self.placeholder_thumbnail)
         thumb_label.pack(side=tk.LEFT, padx=3, pady=2)
         
         # Info
         info = ttk.Frame(item)
         info.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=3)
         
-        name = os.path.basename(image_path)
-        if len(name) > 30:
-            name = name[:27] + "..."
+        name_label = ttk.Label(info, font=("Arial", 8, "bold"))
+        name_label.pack(anchor="w")
+        index_label = ttk.Label(info, text=f"#{index + 1}", font=("Arial", 7), foreground="#7f8c8d")
+        index_label.pack(anchor="w")
         
-        ttk.Label(info, text=name, font=("Arial", 8, "bold")).pack(anchor="w")
-        ttk.Label(info, text=f"#{index + 1}", font=("Arial", 7), foreground="#7f8c8d").pack(anchor="w")
+        row = ImageRow(item, thumb_label, name_label, index_label, index)
         
-        # Botones
+        # Botones (usan la posición actual de la fila, no la de creación)
         btn_frame = ttk.Frame(item)
         btn_frame.pack(side=tk.RIGHT, padx=2)
         
         ttk.Button(
             btn_frame, text="↑", width=2,
-            command=lambda: self.move_image_up(index)
+            command=lambda: self.move_image_up(row.index)
         ).pack(side=tk.LEFT, padx=1)
         
         ttk.Button(
             btn_frame, text="↓", width=2,
-            command=lambda: self.move_image_down(index)
+            command=lambda: self.move_image_down(row.index)
         ).pack(side=tk.LEFT, padx=1)
         
         ttk.Button(
             btn_frame, text="×", width=2,
-            command=lambda: self.remove_image(index)
+            command=lambda: self.remove_image(row.index)
         ).pack(side=tk.LEFT, padx=1)
+        
+        if self.virtual_list:
+            row.window = self.canvas.create_window(
+                0, index * self.row_height, window=item, anchor="nw",
+                width=self.canvas.winfo_width(), height=self.row_height - 2
+            )
+        
+        self.set_row_path(row, image_path)
+        return row
+    
+    def set_row_path(self, row, image_path):
+        """Mostrar otra ruta en una fila existente"""
+        if row.path == image_path:
+            return
+        
+        row.path = image_path
+        name = os.path.basename(image_path)
+        if len(name) > 30:
+            name = name[:27] + "..."
+        row.name_label.config(text=name)
+        self.release_row_photo(row)
+        
+        if image_path in self.photo_pool:
+            self.set_thumbnail(row, image_path, None)
+            return
+        
+        row.thumb_label.config(image=self.placeholder_thumbnail)
+        self.thumbnail_loader.request(
+            image_path,
+            lambda image: self.set_thumbnail(row, image_path, image)
+        )
+    
+    def set_thumbnail(self, row, image_path, image):
+        """Colocar la miniatura de una ruta en su fila"""
+        if row.path != image_path or row.photo_path == image_path:
+            return
+        if image is None and image_path not in self.photo_pool:
+            return
+        if not row.frame.winfo_exists():
+            return
+        
+        row.thumb_label.config(image=self.photo_pool.acquire(image_path, image))
+        row.photo_path = image_path
+    
+    def release_row_photo(self, row):
+        """Devolver al pool la miniatura que muestra una fila"""
+        if row.photo_path is not None:
+            row.thumb_label.config(image=self.placeholder_thumbnail)
+            self.photo_pool.release(row.photo_path)
+            row.photo_path = None
+    
+    def destroy_row(self, row):
+        """Destruir una fila liberando su miniatura"""
+        self.release_row_photo(row)
+        row.frame.destroy()
+    
+    def swap_images(self, first, second):
+        """Intercambiar dos imágenes tocando solo sus dos filas"""
+        self.image_paths[first], self.image_paths[second] = \
+            self.image_paths[second], self.image_paths[first]
+        if self.virtual_list:
+            self.render_visible_rows()
+        else:
+            self.set_row_path(self.image_rows[first], self.image_paths[first])
+            self.set_row_path(self.image_rows[second], self.image_paths[second])
+        self.update_info()
     
     def move_image_up(self, index):
         """Mover imagen arriba"""
         if index > 0:
-            self.image_paths[index], self.image_paths[index-1] = \
-                self.image_paths[index-1], self.image_paths[index]
-            self.update_image_list()
-            self.update_info()
+            self.swap_images(index, index - 1)
     
     def move_image_down(self, index):
         """Mover imagen abajo"""
         if index < len(self.image_paths) - 1:
-            self.image_paths[index], self.image_paths[index+1] = \
-                self.image_paths[index+1], self.image_paths[index]
-            self.update_image_list()
-            self.update_info()
+            self.swap_images(index, index + 1)
     
     def remove_image(self, index):
         """Eliminar imagen"""
         if 0 <= index < len(self.image_paths):
             self.image_paths.pop(index)
-            self.update_image_list()
+            if self.virtual_list:
+                self.render_visible_rows()
+                self.refresh_list_state()
+                self.update_info()
+                return
+            
+            self.destroy_row(self.image_rows.pop(index))
+            
+            # Las filas siguientes solo cambian su número
+            for row in self.image_rows[index:]:
+                row.index -= 1
+                row.index_label.config(text=f"#{row.index + 1}")
+            
+            self.refresh_list_state()
             self.update_info()
     
     def clear_all(self):
         """Limpiar todo"""
         if self.image_paths:
             self.image_paths.clear()
-            self.thumbnails.clear()
             self.update_image_list()
             self.update_info()
     
     def update_info(self):
-        """Actualizar información"""
+        """Actualizar información y vista previa"""
+        self.schedule_preview()
         if not self.image_paths:
-            self.info_label.config(text="Agrega imágenes\npara comenzar")
+            self.info_label.config(text="Agrega imágenes para comenzar")
             return
         
         mode = self.combination_mode.get()
@@ -608,15 +860,108 @@ class MainWindow:
         mode_text = {
             "vertical": "⬇️ Vertical",
             "horizontal": "➡️ Horizontal",
-            "grid": "🔲 Cuadrícula"
+            "grid": "🔲 Cuadrícula",
+            "packed": "📦 Empaquetado"
         }
         
-        info = f"Modo: {mode_text.get(mode, mode)}\n"
-        info += f"Imágenes: {count}\n"
+        info = f"Modo: {mode_text.get(mode, mode)} · "
+        info += f"Imágenes: {count} · "
         info += f"Espaciado: {self.spacing_var.get()} px"
         
         self.info_label.config(text=info)
     
+    def get_background(self):
+        """Color de fondo elegido, en el formato que espera el procesador"""
+        bg_map = {
+            "Blanco": "white",
+            "Negro": "black",
+            "Transparente": "transparent",
+            "Gris claro": "#f0f0f0"
+        }
+        return bg_map.get(self.bg_color.get(), "white")
+    
+    def get_layout_options(self):
+        """Opciones de la cuadrícula elegidas en la interfaz"""
+        try:
+            columns = max(1, int(self.grid_columns_var.get()))
+        except ValueError:
+            columns = None
+        return {
+            "columns": columns,
+            "cell_sizing": "rowcol" if self.grid_fit_var.get() else "uniform",
+        }
+    
+    def schedule_preview(self):
+        """Programar un redibujado de la vista previa agrupando cambios seguidos"""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(APP_CONFIG["preview_delay_ms"], self.render_preview)
+    
+    def on_preview_proxy(self, image):
+        """Redibujar la vista previa cuando llega un proxy (no si falló)"""
+        if image is not None:
+            self.schedule_preview()
+    
+    def render_preview(self):
+        """Dibujar la combinación a resolución de pantalla con proxies reducidos
+        
+        La geometría sale de las cabeceras (ya en caché) y cada imagen se pinta
+        con su proxy en memoria; las que aún no lo tienen se muestran en gris y
+        se piden en segundo plano, que volverá a programar la vista previa
+        cuando llegue el proxy (las que no se pueden decodificar quedan en gris).
+        """
+        self.preview_job = None
+        self.preview_canvas.delete("all")
+        if not self.image_paths:
+            return
+        
+        width = max(self.preview_canvas.winfo_width(), 1)
+        height = APP_CONFIG["preview_height"]
+        paths = list(self.image_paths)
+        
+        try:
+            plan = self.processor.plan_layout(
+                paths, self.combination_mode.get(), int(self.spacing_var.get()),
+                self.get_background(), layout_options=self.get_layout_options()
+            )
+        except Exception:
+            return
+        
+        canvas_size = plan.canvas_size
+        scale = min(width / canvas_size[0], height / canvas_size[1], 1.0)
+        preview = self.processor.create_canvas(
+            (max(1, int(canvas_size[0] * scale)), max(1, int(canvas_size[1] * scale))),
+            plan.background_color
+        )
+        
+        for path, x, y, w, h, _ in plan.placements:
+            box = (int(x * scale), int(y * scale))
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            proxy = self.preview_loader.get_cached(path)
+            if proxy is None:
+                preview.paste("lightgray", box + (box[0] + size[0], box[1] + size[1]))
+                self.preview_loader.request(path, self.on_preview_proxy)
+            else:
+                # Igual que en la salida: el alfa se mezcla con el fondo
+                self.processor.paste_image(
+                    preview, proxy.resize(size, Image.Resampling.BILINEAR), box
+                )
+        
+        self.preview_photo = ImageTk.PhotoImage(preview)
+        self.preview_canvas.create_image(width // 2, height // 2, image=self.preview_photo)
+    
+    def update_memory_readout(self):
+        """Refrescar periódicamente el uso de memoria y de miniaturas"""
+        rss = get_rss_bytes()
+        memory = format_file_size(rss) if rss is not None else "n/d"
+        text = f"Memoria: {memory} · Miniaturas en uso: {len(self.photo_pool)}"
+        
+        cache = self.processor.decoded_cache
+        if cache is not None:
+            text += f" · Caché: {format_file_size(cache.current_bytes)}"
+        self.memory_label.config(text=text)
+        self.root.after(APP_CONFIG["memory_readout_ms"], self.update_memory_readout)
+    
     def show_progress(self, show=True):
         """Mostrar/ocultar progreso"""
         if show:
@@ -642,16 +987,23 @@ class MainWindow:
             mode = self.combination_mode.get()
             spacing = int(self.spacing_var.get())
             
-            bg_map = {
-                "Blanco": "white",
-                "Negro": "black",
-                "Transparente": "transparent",
-                "Gris claro": "#f0f0f0"
-            }
-            background = bg_map.get(self.bg_color.get(), "white")
+            background = self.get_background()
+            layout_options = self.get_layout_options()
             
             output_format = self.output_format.get()
             quality = self.quality_var.get()
+            low_memory = self.low_memory_var.get() and output_format == "PNG"
+            export_all = self.export_all_var.get() and not low_memory
+            max_bytes = None
+            png_profile = self.png_profiles[self.png_profile_var.get()]
+            if self.compress_var.get():
+                # PNG no tiene calidad: se usa el perfil más compacto
+                max_bytes = int(self.target_kb_var.get()) * 1024
+                png_profile = "smallest"
+            dedup = self.dedup_var.get()
+            dedup_near = self.dedup_near_var.get()
+            max_dimension = self.max_dimension_var.get()
+            max_dimension = None if max_dimension == "Original" else int(max_dimension)
             
         except ValueError as e:
             messagebox.showerror("Error", f"Configuración inválida: {str(e)}")
@@ -677,29 +1029,81 @@ class MainWindow:
         
         def process():
             try:
-                images = []
-                for i, path in enumerate(self.image_paths):
-                    self.root.after(0, lambda i=i: self.progress_label.config(
-                        text=f"Procesando {i+1}/{len(self.image_paths)}..."
-                    ))
-                    images.append(self.processor.open_image(path))
+                paths = list(self.image_paths)
+                timings = {}
+                duplicates = []
                 
-                self.root.after(0, lambda: self.progress_label.config(text="Combinando..."))
+                def report(i, total):
+                    text = f"Procesando {i+1}/{total}..."
+                    if timings:
+                        text += f"\n{self.format_timings(timings)}"
+                    self.root.after(0, lambda: self.progress_label.config(text=text))
                 
-                if mode == "vertical":
-                    result = self.processor.combine_images_vertical(images, spacing, background)
-                elif mode == "horizontal":
-                    result = self.processor.combine_images_horizontal(images, spacing, background)
-                else:
-                    result = self.processor.combine_images_grid(images, spacing, background)
+                if dedup:
+                    # Descartar duplicados antes de decodificar nada
+                    self.root.after(0, lambda: self.progress_label.config(
+                        text="Buscando duplicados..."
+                    ))
+                    paths, duplicates = find_duplicates(paths, near=dedup_near)
+                    if len(paths) < 2:
+                        raise ValueError("Tras omitir duplicados quedan menos de 2 imágenes")
+                
+                if low_memory:
+                    # Escribir el PNG franja a franja sin lienzo completo
+                    start = time.perf_counter()
+                    size = self.processor.combine_paths_to_png(
+                        paths, save_path, mode, spacing, background,
+                        progress_callback=report, max_dimension=max_dimension,
+                        layout_options=layout_options, png_profile=png_profile
+                    )
+                    timings["total"] = time.perf_counter() - start
+                    self.root.after(0, lambda: self.show_success(
+                        "PNG", f"{quality}%", len(paths), size, save_path, timings,
+                        len(duplicates)
+                    ))
+                    return
                 
-                final_quality = max(40, quality - 30) if self.compress_var.get() else quality
+                # Reutiliza el resultado anterior si solo cambió la cola
+                result, stats = self.incremental.merge(
+                    paths, save_path, mode, spacing, background,
+                    max_dimension=max_dimension, progress_callback=report, timings=timings,
+                    layout_options=layout_options
+                )
                 
-                self.root.after(0, lambda: self.progress_label.config(text="Guardando..."))
-                self.processor.save_image(result, save_path, output_format, final_quality)
+                saving_text = (
+                    f"Guardando... (reutilizadas {stats['reused']}, pegadas {stats['pasted']})\n"
+                    f"{self.format_timings(timings)}"
+                )
+                self.root.after(0, lambda: self.progress_label.config(text=saving_text))
+                start = time.perf_counter()
+                # Los demás formatos se codifican a la vez desde el mismo lienzo
+                extra_outputs = []
+                if export_all:
+                    stem = os.path.splitext(save_path)[0]
+                    extra_outputs = [
+                        (stem + extension, format_name, quality)
+                        for format_name, extension in (("PNG", ".png"), ("JPEG", ".jpg"), ("WebP", ".webp"))
+                        if format_name != output_format
+                    ]
+                saved = self.incremental.save(
+                    result, save_path, output_format, quality, png_profile,
+                    extra_outputs=extra_outputs, max_bytes=max_bytes
+                )
+                timings["guardado"] = time.perf_counter() - start
                 
+                formats = ", ".join(item["format"] for item in saved)
+                saved_paths = "\n".join(item["path"] for item in saved)
+                quality_text = f"{quality}%"
+                sized = [item for item in saved if "trials" in item]
+                if sized:
+                    quality_text = ", ".join(
+                        f"{item['format']} {item['quality']}%"
+                        f"{'' if item['fits'] else ' (no cabe)'}"
+                        for item in sized
+                    ) + f" · {sum(item['trials'] for item in sized)} pruebas"
                 self.root.after(0, lambda: self.show_success(
-                    output_format, quality, len(images), result.size, save_path
+                    formats, quality_text, len(paths), result.size, saved_paths, timings,
+                    len(duplicates)
                 ))
                 
             except Exception as e:
@@ -713,16 +1117,26 @@ class MainWindow:
         thread.daemon = True
         thread.start()
     
-    def show_success(self, format, quality, count, size, path):
+    def format_timings(self, timings):
+        """Formatear tiempos por etapa para la etiqueta de progreso"""
+        return " · ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    
+    def show_success(self, format, quality, count, size, path, timings=None, skipped=0):
         """Mostrar mensaje de éxito"""
         msg = (
             f"✅ ¡Éxito!\n\n"
             f"Formato: {format}\n"
-            f"Calidad: {quality}%\n"
+            f"Calidad: {quality}\n"
             f"Imágenes: {count}\n"
+        )
+        if skipped:
+            msg += f"Duplicados omitidos: {skipped}\n"
+        msg += (
             f"Tamaño: {size[0]} × {size[1]} px\n\n"
             f"Guardado en:\n{path}"
         )
+        if timings:
+            msg += f"\n\nTiempos: {self.format_timings(timings)}"
         
         messagebox.showinfo("¡Completado!", msg)
 
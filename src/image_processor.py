@@ -2,15 +2,137 @@
 Módulo para procesamiento y combinación de imágenes
 """
 
-from PIL import Image
+from PIL import Image, ImageColor
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import io
 import os
+import time
+import zlib
 from config import APP_CONFIG
+from png_writer import write_png_strips
+from decoded_cache import DecodedImageCache
+import layout
+
+# Modos de una sola banda de gris (los de 16 bits y flotantes se recortan a L)
+GRAY_MODES = ("1", "L", "LA", "La", "I", "I;16", "I;16L", "I;16B", "F")
+ALPHA_MODES = ("LA", "La", "RGBA", "RGBa", "PA")
+
+# Modos que cada formato puede guardar tal cual
+SAVE_MODES = {
+    "JPEG": ("L", "RGB", "CMYK"),
+    "WEBP": ("RGB", "RGBA"),
+    "BMP": ("1", "L", "P", "RGB", "RGBA"),
+}
+
+# Nombres de formato aceptados y el nombre que espera Pillow
+FORMAT_ALIASES = {
+    "png": "PNG",
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "webp": "WEBP",
+    "bmp": "BMP",
+    "gif": "GIF",
+    "tif": "TIFF",
+    "tiff": "TIFF",
+}
+
+
+def resolve_format(output_path, format_name=None):
+    """Elegir el formato de salida a partir de la opción o de la extensión"""
+    if not format_name:
+        format_name = os.path.splitext(output_path)[1].lstrip(".") or APP_CONFIG["default_output_format"]
+    
+    key = format_name.lower()
+    if key not in FORMAT_ALIASES:
+        raise ValueError(f"Formato de salida no soportado: {format_name}")
+    return FORMAT_ALIASES[key]
+
+
+# Datos de cabecera: dimensiones, modo, si tiene transparencia y la paleta
+# RGB en bytes (solo en modo P), para saber si varias fuentes la comparten
+ImageHeader = namedtuple("ImageHeader", "size mode alpha palette")
+
+
+def header_palette(img):
+    """Paleta RGB en bytes de una imagen en modo P, sin decodificar sus píxeles
+    
+    PNG y GIF guardan la paleta tal cual en la cabecera. Con otra disposición
+    (BGRX en BMP, RGB;L en TIFF) se recurre a `getpalette`, que decodifica.
+    """
+    if (img.palette.rawmode or img.palette.mode) == "RGB":
+        return bytes(img.palette.palette)
+    return bytes(img.getpalette() or [])
+
+
+def image_header(img):
+    """Extraer los datos de cabecera de una imagen abierta sin decodificarla"""
+    alpha = img.mode in ALPHA_MODES or (img.mode == "P" and "transparency" in img.info)
+    palette = None
+    if img.mode == "P" and img.palette is not None:
+        palette = header_palette(img)
+    return ImageHeader(tuple(img.size), img.mode, alpha, palette)
+
+
+def save_png(image, fp, candidates):
+    """Guardar un PNG con la alternativa de opciones que da el archivo más pequeño
+    
+    `candidates` es la lista de `png_save_options`; con una sola alternativa
+    se guarda directamente. `fp` es una ruta o un archivo abierto en binario.
+    """
+    if len(candidates) == 1:
+        image.save(fp, "PNG", **candidates[0])
+        return
+    
+    best = None
+    for options in candidates:
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG", **options)
+        if best is None or buffer.tell() < best.tell():
+            best = buffer
+    if isinstance(fp, (str, os.PathLike)):
+        with open(fp, "wb") as f:
+            f.write(best.getbuffer())
+    else:
+        fp.write(best.getbuffer())
+
+
+def palette_index(palette, color):
+    """Índice de un color en una paleta plana [r, g, b, ...] o None"""
+    rgb = list(ImageColor.getrgb(color)[:3])
+    for index in range(len(palette) // 3):
+        if palette[index * 3:index * 3 + 3] == rgb:
+            return index
+    return None
+
+
+def saves_as_is(mode, format):
+    """Indicar si el formato guarda ese modo sin convertir la imagen"""
+    allowed = SAVE_MODES.get(format.upper())
+    return allowed is None or mode in allowed
+
+
+def encodable_image(image, format):
+    """Convertir al modo más parecido que el formato pueda guardar"""
+    if saves_as_is(image.mode, format):
+        return image
+    allowed = SAVE_MODES[format.upper()]
+    if image.mode in ALPHA_MODES and "RGBA" in allowed:
+        return image.convert("RGBA")
+    if image.mode in GRAY_MODES and "L" in allowed:
+        return image.convert("L")
+    return image.convert("RGB")
+
 
 class ImageProcessor:
     """Clase para manejar el procesamiento de imágenes"""
     
-    def __init__(self):
+    def __init__(self, decoded_cache_bytes=0):
         self.supported_formats = APP_CONFIG["supported_formats"]
+        # (ruta, mtime, tamaño) -> ImageHeader; evita reabrir cabeceras ya leídas
+        self._header_cache = {}
+        # Imágenes decodificadas reutilizables entre combinaciones (0 = sin caché)
+        self.decoded_cache = DecodedImageCache(decoded_cache_bytes) if decoded_cache_bytes else None
     
     def validate_image(self, file_path):
         """Validar si un archivo es una imagen soportada"""
@@ -20,16 +142,175 @@ class ImageProcessor:
         except:
             return False
     
-    def open_image(self, file_path):
-        """Abrir una imagen y convertir a RGB"""
+    def open_image(self, file_path, target_size=None, mode="RGB"):
+        """Abrir una imagen y entregarla en el modo indicado (RGB por defecto)
+        
+        Con `target_size` la imagen se entrega a ese tamaño: los JPEG se
+        decodifican ya reducidos con `draft()` (escalado en el dominio DCT) y el
+        resto se reduce por un factor entero con `reduce()` antes del ajuste final.
+        La conversión de modo se hace al final, sobre la imagen ya reducida,
+        salvo para paletas y modos de más de 8 bits, que no se pueden promediar.
+        
+        La imagen se entrega ya cargada. Si hay caché de imágenes decodificadas,
+        puede ser un objeto compartido: no debe modificarse ni cerrarse.
+        """
         try:
+            key = None
+            if self.decoded_cache is not None:
+                key = self.decoded_cache.make_key(file_path, mode, target_size)
+                cached = self.decoded_cache.get(key)
+                if cached is not None:
+                    return cached
+            
             image = Image.open(file_path)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+            if target_size and tuple(target_size) != image.size:
+                if image.format == "JPEG":
+                    image.draft(mode if mode in ('L', 'RGB') else None, target_size)
+                
+                if mode != 'P' and image.mode not in ('L', 'LA', 'RGB', 'RGBA'):
+                    converted = image.convert(mode)
+                    image.close()
+                    image = converted
+                
+                # En modo P se reduce por vecino más próximo (índices de paleta)
+                factor = min(image.width // target_size[0], image.height // target_size[1])
+                if factor >= 2 and image.mode != 'P':
+                    reduced = image.reduce(factor)
+                    image.close()
+                    image = reduced
+                
+                if image.size != tuple(target_size):
+                    resized = image.resize(target_size, Image.Resampling.LANCZOS)
+                    image.close()
+                    image = resized
+            
+            if image.mode != mode:
+                converted = image.convert(mode)
+                image.close()
+                image = converted
+            image.load()
+            
+            if key is not None:
+                self.decoded_cache.put(key, image)
             return image
         except Exception as e:
             raise Exception(f"Error al abrir la imagen {file_path}: {str(e)}")
     
+    def load_thumbnail(self, file_path, size=(60, 45)):
+        """Decodificar una miniatura reducida, lista para mostrar"""
+        with Image.open(file_path) as image:
+            if image.format == "JPEG":
+                image.draft('RGB', size)
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA'):
+                has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+                return image.convert('RGBA' if has_alpha else 'RGB')
+            return image.copy()
+    
+    def get_image_header(self, file_path):
+        """Leer solo la cabecera de una imagen: dimensiones, modo y paleta
+        
+        El resultado se guarda por (ruta, mtime, tamaño de archivo), así que un
+        archivo sin cambios no vuelve a abrirse.
+        """
+        try:
+            stat = os.stat(file_path)
+            key = (file_path, stat.st_mtime_ns, stat.st_size)
+            header = self._header_cache.get(key)
+            if header is not None and header.mode is not None:
+                return header
+            
+            with Image.open(file_path) as img:
+                header = image_header(img)
+            
+            self.cache_image_header(file_path, stat.st_mtime_ns, stat.st_size, header)
+            return header
+        except Exception as e:
+            raise Exception(f"Error al leer la imagen {file_path}: {str(e)}")
+    
+    def get_image_size(self, file_path):
+        """Dimensiones de una imagen leyendo solo su cabecera"""
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            raise Exception(f"Error al leer la imagen {file_path}: {str(e)}")
+        header = self._header_cache.get((file_path, stat.st_mtime_ns, stat.st_size))
+        if header is not None:
+            return header.size
+        return self.get_image_header(file_path).size
+    
+    def cache_image_header(self, file_path, mtime_ns, file_size, header):
+        """Registrar una cabecera ya leída (p. ej. por el escáner de carpetas)"""
+        if len(self._header_cache) >= APP_CONFIG["header_cache_items"]:
+            try:
+                self._header_cache.pop(next(iter(self._header_cache)), None)
+            except (StopIteration, RuntimeError):
+                pass
+        self._header_cache[(file_path, mtime_ns, file_size)] = header
+    
+    def cache_image_size(self, file_path, mtime_ns, file_size, size):
+        """Registrar solo dimensiones ya conocidas; el modo se leerá si hace falta"""
+        self.cache_image_header(
+            file_path, mtime_ns, file_size, ImageHeader(tuple(size), None, False, None)
+        )
+    
+    def create_canvas(self, size, background_color="#FFFFFF", mode=None, palette=None):
+        """Crear el lienzo de salida con el color de fondo indicado
+        
+        Sin `mode`, el lienzo es RGBA si el fondo es transparente y RGB si no.
+        En modo P el fondo debe estar en `palette`.
+        """
+        transparent = background_color.upper() == "TRANSPARENT"
+        if mode is None:
+            mode = 'RGBA' if transparent else 'RGB'
+        if transparent:
+            return Image.new(mode, size, 0)
+        if mode == 'P':
+            canvas = Image.new('P', size, palette_index(palette, background_color))
+            canvas.putpalette(palette)
+            return canvas
+        return Image.new(mode, size, background_color)
+    
+    def create_plan_canvas(self, plan, size=None):
+        """Lienzo (o franja, con `size`) en el modo y con el fondo de un plan"""
+        return self.create_canvas(
+            size or plan.canvas_size, plan.background_color, plan.canvas_mode, plan.palette
+        )
+    
+    def paste_image(self, canvas, image, box):
+        """Pegar una fuente; si trae alfa y el lienzo es opaco, se mezcla con el fondo"""
+        if image.mode in ALPHA_MODES and canvas.mode not in ALPHA_MODES:
+            canvas.paste(image, box, image)
+        else:
+            canvas.paste(image, box)
+    
+    def plan_canvas_mode(self, headers, background_color, scaled=False):
+        """Elegir el modo de lienzo más estrecho que cubre todas las fuentes
+        
+        - Fondo transparente: LA si todas son grises, RGBA si no.
+        - Fondo opaco gris y todas las fuentes grises: L.
+        - Todas en paleta, sin transparencia, con la misma paleta, sin reescalar
+          y con el fondo dentro de la paleta: P.
+        - En otro caso, RGB.
+        
+        Devuelve (modo, paleta o None).
+        """
+        gray = all(h.mode in GRAY_MODES for h in headers)
+        if background_color.upper() == "TRANSPARENT":
+            return ("LA" if gray else "RGBA"), None
+        
+        r, g, b = ImageColor.getrgb(background_color)[:3]
+        if gray and r == g == b:
+            return "L", None
+        
+        palettes = {h.palette for h in headers}
+        if not scaled and len(palettes) == 1 and None not in palettes \
+                and all(h.mode == "P" and not h.alpha for h in headers):
+            palette = list(headers[0].palette)
+            if palette and palette_index(palette, background_color) is not None:
+                return "P", palette
+        return "RGB", None
+    
     def combine_images_vertical(self, images, spacing=0, background_color="#FFFFFF"):
         """Combinar imágenes verticalmente"""
         if not images:
@@ -40,10 +321,7 @@ class ImageProcessor:
         total_height = sum(img.height for img in images) + (spacing * (len(images) - 1))
         
         # Crear imagen resultante
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (max_width, total_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (max_width, total_height), background_color)
+        result = self.create_canvas((max_width, total_height), background_color)
         
         # Pegar imágenes
         y_offset = 0
@@ -64,10 +342,7 @@ class ImageProcessor:
         max_height = max(img.height for img in images)
         
         # Crear imagen resultante
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (total_width, max_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (total_width, max_height), background_color)
+        result = self.create_canvas((total_width, max_height), background_color)
         
         # Pegar imágenes
         x_offset = 0
@@ -78,54 +353,416 @@ class ImageProcessor:
         
         return result
     
-    def combine_images_grid(self, images, spacing=0, background_color="#FFFFFF"):
-        """Combinar imágenes en cuadrícula (2 columnas)"""
+    def combine_images_grid(self, images, spacing=0, background_color="#FFFFFF",
+                            columns=None, rows=None, cell_sizing=None):
+        """Combinar imágenes en cuadrícula (2 columnas por defecto)"""
         if not images:
             raise ValueError("No hay imágenes para combinar")
         
-        # Calcular dimensiones de la cuadrícula
-        cols = 2
-        rows = (len(images) + cols - 1) // cols
+        canvas_size, positions = self.compute_layout(
+            [img.size for img in images], "grid", spacing,
+            columns=columns, rows=rows, cell_sizing=cell_sizing
+        )
         
-        max_width = max(img.width for img in images)
-        max_height = max(img.height for img in images)
+        # Crear imagen resultante y pegar cada imagen en su celda
+        result = self.create_canvas(canvas_size, background_color)
+        for img, position in zip(images, positions):
+            result.paste(img, position)
         
-        total_width = (max_width * cols) + (spacing * (cols - 1))
-        total_height = (max_height * rows) + (spacing * (rows - 1))
+        return result
+    
+    def compute_layout(self, sizes, mode, spacing, columns=None, rows=None, cell_sizing=None):
+        """Calcular lienzo y posiciones de cualquier modo solo con dimensiones
         
-        # Crear imagen resultante
-        if background_color.upper() == "TRANSPARENT":
-            result = Image.new('RGBA', (total_width, total_height), (0, 0, 0, 0))
-        else:
-            result = Image.new('RGB', (total_width, total_height), background_color)
+        Si no se indican ni columnas ni filas, ambas se toman de la
+        configuración (una sola indicada no se mezcla con la otra configurada).
+        Sirve para vistas previas y estimaciones sin tocar píxeles.
+        """
+        if columns is None and rows is None:
+            columns, rows = APP_CONFIG["grid_columns"], APP_CONFIG["grid_rows"]
+        return layout.compute_layout(
+            sizes, mode, spacing, columns=columns, rows=rows,
+            cell_sizing=cell_sizing or APP_CONFIG["grid_cell_sizing"],
+        )
+    
+    def scale_sizes(self, sizes, mode, spacing, max_dimension=None, layout_options=None):
+        """Escalar las dimensiones para que el resultado no supere `max_dimension`
+        
+        El espaciado se mantiene en píxeles de salida; solo se reducen las
+        imágenes, nunca se amplían.
+        """
+        if not max_dimension or not sizes:
+            return list(sizes)
+        
+        layout_options = layout_options or {}
+        canvas, _ = self.compute_layout(sizes, mode, spacing, **layout_options)
+        if max(canvas) <= max_dimension:
+            return list(sizes)
+        
+        # La parte fija de cada lado es la que aporta el espaciado
+        content, _ = self.compute_layout(sizes, mode, 0, **layout_options)
+        scale = 1.0
+        for full, pixels in zip(canvas, content):
+            if full > max_dimension:
+                scale = min(scale, max(max_dimension - (full - pixels), 1) / pixels)
+        
+        # El empaquetado puede reordenar al reducir: ajustar hasta que quepa
+        for _ in range(20):
+            scaled = [(max(1, int(w * scale)), max(1, int(h * scale))) for w, h in sizes]
+            canvas, _ = self.compute_layout(scaled, mode, spacing, **layout_options)
+            if max(canvas) <= max_dimension:
+                break
+            scale *= max_dimension / max(canvas)
+        return scaled
+    
+    def plan_layout(self, file_paths, mode="vertical", spacing=0, background_color="#FFFFFF",
+                    max_dimension=None, layout_options=None):
+        """Calcular el plan de disposición leyendo solo cabeceras
         
-        # Pegar imágenes en cuadrícula
-        for i, img in enumerate(images):
-            row = i // cols
-            col = i % cols
+        No decodifica píxeles: con las cabeceras en caché basta con
+        milisegundos incluso para miles de imágenes (vista previa, estimaciones
+        en seco o comprobar el tamaño de salida antes de combinar). El modo del
+        lienzo se elige con `plan_canvas_mode`.
+        """
+        if not file_paths:
+            raise ValueError("No hay imágenes para combinar")
+        if mode not in layout.LAYOUT_MODES:
+            raise ValueError(f"Modo de combinación desconocido: {mode}")
+        
+        layout_options = {k: v for k, v in (layout_options or {}).items() if v is not None}
+        headers = [self.get_image_header(path) for path in file_paths]
+        original_sizes = [header.size for header in headers]
+        sizes = self.scale_sizes(original_sizes, mode, spacing, max_dimension, layout_options)
+        canvas_size, positions = self.compute_layout(sizes, mode, spacing, **layout_options)
+        canvas_mode, palette = self.plan_canvas_mode(
+            headers, background_color, scaled=sizes != original_sizes
+        )
+        
+        placements = [
+            layout.Placement(path, x, y, w, h, header.alpha)
+            for path, (x, y), (w, h), header in zip(file_paths, positions, sizes, headers)
+        ]
+        options = dict(layout_options, max_dimension=max_dimension)
+        return layout.LayoutPlan(
+            canvas_size, placements, mode, spacing, background_color, options,
+            canvas_mode, palette
+        )
+    
+    def iter_decoded(self, file_paths, workers=None, max_in_flight=None, executor=None,
+                     target_sizes=None, modes=None):
+        """Decodificar imágenes en paralelo entregándolas en el orden original
+        
+        Como mucho hay `max_in_flight` imágenes decodificadas o en curso a la
+        vez, lo que acota la memoria aunque los workers vayan por delante.
+        `target_sizes` y `modes`, si se indican, dan el tamaño y el modo de
+        entrega de cada imagen (RGB por defecto).
+        """
+        workers = workers or APP_CONFIG["decode_workers"] or os.cpu_count() or 1
+        max_in_flight = max_in_flight or APP_CONFIG["decode_max_in_flight"] or workers * 2
+        executor = executor or APP_CONFIG["decode_executor"]
+        jobs = zip(
+            file_paths,
+            target_sizes or [None] * len(file_paths),
+            modes or ["RGB"] * len(file_paths),
+        )
+        
+        if workers <= 1:
+            for job in jobs:
+                yield self.open_image(*job)
+            return
+        
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        pending = deque()
+        with pool_class(max_workers=workers) as pool:
+            try:
+                for job in jobs:
+                    pending.append(pool.submit(self.open_image, *job))
+                    if len(pending) >= max_in_flight:
+                        break
+                
+                while pending:
+                    image = pending.popleft().result()
+                    job = next(jobs, None)
+                    if job is not None:
+                        pending.append(pool.submit(self.open_image, *job))
+                    yield image
+            finally:
+                for future in pending:
+                    future.cancel()
+    
+    def composite(self, plan, progress_callback=None, workers=None, timings=None):
+        """Componer un plan decodificando en orden y liberando cada imagen
+        
+        El lienzo se reserva una sola vez; cada imagen se decodifica ya al
+        tamaño de su colocación, se pega y se libera. Con varios workers la
+        decodificación va unas pocas imágenes por delante del pegado.
+        """
+        if timings is None:
+            timings = {}
+        
+        result = self.create_plan_canvas(plan)
+        timings["decodificación"] = 0.0
+        timings["composición"] = 0.0
+        
+        total = len(plan)
+        decoded = self.iter_decoded(
+            plan.paths, workers, target_sizes=plan.sizes, modes=plan.source_modes
+        )
+        try:
+            for i, placement in enumerate(plan.placements):
+                if progress_callback:
+                    progress_callback(i, total)
+                
+                start = time.perf_counter()
+                img = next(decoded)
+                timings["decodificación"] += time.perf_counter() - start
+                
+                start = time.perf_counter()
+                self.paste_image(result, img, (placement.x, placement.y))
+                del img
+                timings["composición"] += time.perf_counter() - start
+        finally:
+            decoded.close()
+        
+        return result
+    
+    def combine_paths_streaming(self, file_paths, mode="vertical", spacing=0,
+                                background_color="#FFFFFF", progress_callback=None,
+                                workers=None, timings=None, max_dimension=None,
+                                layout_options=None):
+        """Combinar imágenes desde disco: plan con cabeceras y luego `composite`
+        
+        Si se pasa `timings` (dict), se rellena con los segundos de cada etapa.
+        Con `max_dimension` las imágenes se decodifican ya reducidas para que el
+        lado mayor del resultado no lo supere. `layout_options` admite
+        `columns`, `rows` y `cell_sizing` para la cuadrícula.
+        """
+        if timings is None:
+            timings = {}
+        
+        # Pasada de cabeceras: solo dimensiones, sin decodificar píxeles
+        start = time.perf_counter()
+        plan = self.plan_layout(
+            file_paths, mode, spacing, background_color, max_dimension, layout_options
+        )
+        timings["cabeceras"] = time.perf_counter() - start
+        
+        return self.composite(plan, progress_callback, workers, timings)
+    
+    def iter_plan_bands(self, plan, band_height=256, progress_callback=None):
+        """Generar el resultado de un plan como franjas horizontales
+        
+        Cada imagen se decodifica cuando la primera franja la alcanza y se libera
+        en cuanto la última franja la deja atrás. En modo vertical solo hay una o
+        dos imágenes abiertas a la vez; en horizontal todas cruzan cada franja y
+        en cuadrícula, las de una fila.
+        """
+        width, height = plan.canvas_size
+        placements = plan.placements
+        
+        opened = {}
+        decoded = 0
+        for top in range(0, height, band_height):
+            bottom = min(top + band_height, height)
+            band = self.create_plan_canvas(plan, (width, bottom - top))
             
-            x_offset = col * (max_width + spacing)
-            y_offset = row * (max_height + spacing)
+            for i, placement in enumerate(placements):
+                path, x, y, w, h = placement[:5]
+                if y >= bottom or y + h <= top:
+                    continue
+                
+                if i not in opened:
+                    if progress_callback:
+                        progress_callback(decoded, len(placements))
+                    opened[i] = self.open_image(path, (w, h), plan.source_mode(placement))
+                    decoded += 1
+                
+                region = opened[i].crop((0, max(top - y, 0), w, min(bottom - y, h)))
+                self.paste_image(band, region, (x, max(y - top, 0)))
             
-            # Centrar la imagen en su celda
-            x_center = x_offset + (max_width - img.width) // 2
-            y_center = y_offset + (max_height - img.height) // 2
+            # Liberar las imágenes que ya no aparecen en franjas siguientes
+            for i in [i for i in opened if placements[i].y + placements[i].height <= bottom]:
+                del opened[i]
             
-            result.paste(img, (x_center, y_center))
+            yield band
+    
+    def iter_bands(self, file_paths, mode="vertical", spacing=0,
+                   background_color="#FFFFFF", band_height=256, progress_callback=None,
+                   max_dimension=None, layout_options=None):
+        """Generar el resultado combinado como franjas horizontales"""
+        plan = self.plan_layout(
+            file_paths, mode, spacing, background_color, max_dimension, layout_options
+        )
+        return self.iter_plan_bands(plan, band_height, progress_callback)
+    
+    def write_plan_png(self, plan, file_path, band_height=256, png_profile=None,
+                       progress_callback=None):
+        """Componer un plan y guardarlo como PNG franja a franja
         
-        return result
+        Del perfil PNG se usan el nivel y la estrategia de zlib de su primera
+        alternativa; el escritor por franjas no filtra filas ni hace la pasada
+        de `optimize`.
+        """
+        options = self.png_save_options(png_profile)[0]
+        bands = self.iter_plan_bands(plan, band_height, progress_callback)
+        try:
+            write_png_strips(
+                file_path, plan.canvas_size, plan.canvas_mode, bands,
+                options.get("compress_level", 6),
+                options.get("compress_type", zlib.Z_DEFAULT_STRATEGY),
+                plan.palette
+            )
+        except Exception as e:
+            raise Exception(f"Error al guardar la imagen: {str(e)}")
+        
+        return plan.canvas_size
+    
+    def combine_paths_to_png(self, file_paths, file_path, mode="vertical", spacing=0,
+                             background_color="#FFFFFF", band_height=256,
+                             png_profile=None, progress_callback=None,
+                             max_dimension=None, layout_options=None):
+        """Combinar y guardar como PNG franja a franja, sin lienzo en memoria
+        
+        Devuelve las dimensiones del resultado escrito.
+        """
+        plan = self.plan_layout(
+            file_paths, mode, spacing, background_color, max_dimension, layout_options
+        )
+        return self.write_plan_png(plan, file_path, band_height, png_profile,
+                                   progress_callback)
     
-    def save_image(self, image, file_path, format="PNG", quality=95):
-        """Guardar imagen en el formato especificado"""
+    def merge_files(self, file_paths, mode="vertical", spacing=0, background_color="#FFFFFF",
+                    max_dimension=None, workers=None, progress_callback=None, timings=None,
+                    layout_options=None):
+        """Combinar archivos de imagen en el modo indicado
+        
+        Todos los modos usan el compositor en streaming: la disposición se
+        calcula con las cabeceras y cada imagen se pega y se libera.
+        """
+        return self.combine_paths_streaming(
+            file_paths, mode, spacing, background_color,
+            progress_callback=progress_callback, workers=workers,
+            timings=timings, max_dimension=max_dimension,
+            layout_options=layout_options
+        )
+    
+    def merge_animated(self, file_paths, file_path, mode="vertical", spacing=0,
+                       background_color="#FFFFFF", format="GIF", quality=90,
+                       max_dimension=None, progress_callback=None, layout_options=None):
+        """Combinar entradas animadas fotograma a fotograma en un GIF o WebP animado
+        
+        La disposición se calcula con el primer fotograma de cada entrada; los
+        fotogramas se componen y codifican de uno en uno (ver `animation`).
+        Devuelve un dict con el tamaño del lienzo, los fotogramas y la duración en ms.
+        """
+        from animation import write_animation
+        
+        plan = self.plan_layout(
+            file_paths, mode, spacing, background_color, max_dimension, layout_options
+        )
+        # Los fotogramas siguientes pueden traer colores que no están en el primero
+        plan.canvas_mode = "RGBA" if background_color.upper() == "TRANSPARENT" else "RGB"
+        plan.palette = None
+        return write_animation(self, plan, file_path, format, quality, progress_callback)
+    
+    def png_save_options(self, profile=None):
+        """Alternativas de opciones de Pillow del perfil PNG indicado (o el configurado)
+        
+        Siempre es una lista; los perfiles de una sola opción dan un elemento.
+        """
+        profile = profile or APP_CONFIG["png_profile"]
+        if profile not in APP_CONFIG["png_profiles"]:
+            raise ValueError(f"Perfil PNG desconocido: {profile}")
+        options = APP_CONFIG["png_profiles"][profile]
+        if isinstance(options, dict):
+            options = [options]
+        return [dict(alternative) for alternative in options]
+    
+    def save_image(self, image, file_path, format="PNG", quality=95, png_profile=None):
+        """Guardar imagen en el formato especificado
+        
+        PNG no tiene calidad: se codifica con el perfil `png_profile`
+        ("fast", "balanced" o "smallest").
+        """
+        png_options = self.png_save_options(png_profile)
+        image = encodable_image(image, format)
         try:
-            if format.upper() == "PNG" and image.mode == 'RGBA':
-                image.save(file_path, format.upper(), compress_level=9)
+            if format.upper() == "PNG":
+                save_png(image, file_path, png_options)
             else:
                 image.save(file_path, format.upper(), quality=quality)
             return True
         except Exception as e:
             raise Exception(f"Error al guardar la imagen: {str(e)}")
     
+    def save_image_to_size(self, image, file_path, format, max_bytes):
+        """Guardar en JPEG/WebP con la mayor calidad que no supere `max_bytes`
+        
+        Devuelve el SizedEncode de la búsqueda (calidad elegida, codificaciones
+        de prueba y si cabe en el presupuesto).
+        """
+        from target_size import encode_to_size
+        
+        result = encode_to_size(encodable_image(image, format), format, max_bytes)
+        try:
+            with open(file_path, "wb") as f:
+                f.write(result.data)
+        except Exception as e:
+            raise Exception(f"Error al guardar la imagen: {str(e)}")
+        return result
+    
+    def save_outputs(self, image, outputs, png_profile=None, workers=None, max_bytes=None):
+        """Guardar el mismo lienzo en varios archivos a la vez
+        
+        `outputs` es una lista de (ruta, formato, calidad). Cada codificación
+        corre en un hilo (los codificadores de Pillow liberan el GIL), así que
+        varios formatos cuestan más o menos el tiempo del más lento. Pillow
+        guarda las opciones del codificador en el objeto imagen, así que solo
+        una salida guarda el lienzo tal cual; las que lo convierten de modo ya
+        tienen su propia imagen y el resto usa una copia.
+        Con `max_bytes`, las salidas JPEG/WebP buscan la calidad que cabe en
+        ese tamaño en lugar de usar la indicada, y las PNG usan el perfil
+        "smallest" si no se indica otro. Devuelve, en orden, un dict por
+        salida con ruta, formato, bytes y segundos (y calidad y pruebas si se
+        buscó el tamaño).
+        """
+        if max_bytes and png_profile is None:
+            png_profile = "smallest"
+        
+        def sized(format):
+            return bool(max_bytes) and format.upper() in ("JPEG", "WEBP")
+        
+        # Primera salida que codifica el propio lienzo (las de tamaño objetivo solo lo leen)
+        owner = next((
+            i for i, (_, format, _) in enumerate(outputs)
+            if not sized(format) and saves_as_is(image.mode, format)
+        ), None)
+        
+        def save(index):
+            file_path, format, quality = outputs[index]
+            start = time.perf_counter()
+            info = {"path": file_path, "format": format.upper()}
+            if sized(format):
+                result = self.save_image_to_size(image, file_path, format, max_bytes)
+                info.update(quality=result.quality, trials=result.trials, fits=result.fits)
+            else:
+                source = encodable_image(image, format)
+                if source is image and index != owner:
+                    source = image.copy()
+                self.save_image(source, file_path, format, quality, png_profile)
+            info["bytes"] = os.path.getsize(file_path)
+            info["seconds"] = time.perf_counter() - start
+            return info
+        
+        if len(outputs) == 1:
+            return [save(0)]
+        
+        # Cargar antes de repartir para que los hilos solo lean píxeles
+        image.load()
+        workers = workers or APP_CONFIG["export_workers"] or len(outputs)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(save, range(len(outputs))))
+    
     def get_image_info(self, file_path):
         """Obtener información básica de una imagen"""
         try:
@@ -0,0 +1,245 @@
+"""
+Re-combinación incremental que reutiliza el resultado anterior
+
+Cada resultado guardado va acompañado de un manifiesto de disposición con
+la firma y la posición de cada imagen: junto a la salida
+(`<salida>.layout.json`) o, con `manifest_dir`, en una carpeta aparte con
+un nombre derivado de la ruta de la salida; en esa carpeta solo se
+conservan los `incremental_manifest_max_files` más recientes. Al volver
+a combinar en la misma salida solo se decodifican y pegan las imágenes que
+cambiaron (añadidas al final o reemplazadas en su sitio); el resto de píxeles
+se copia del resultado anterior, que se conserva en memoria o se recarga del
+disco si el formato no tiene pérdida.
+"""
+
+import hashlib
+import json
+import os
+import time
+from PIL import Image
+from config import APP_CONFIG
+
+MANIFEST_SUFFIX = ".layout.json"
+
+# Formatos que se pueden recargar sin degradar la imagen
+LOSSLESS_FORMATS = ("PNG", "TIFF", "BMP")
+
+
+class IncrementalMerger:
+    """Combina imágenes reutilizando el lienzo y el manifiesto anteriores"""
+    
+    def __init__(self, processor, keep_in_memory=True, manifest_dir=None, max_manifests=None):
+        self.processor = processor
+        self.keep_in_memory = keep_in_memory
+        self.manifest_dir = manifest_dir
+        self.max_manifests = max_manifests or APP_CONFIG["incremental_manifest_max_files"]
+        self._last = None
+        self._pending = None
+    
+    def manifest_path(self, output_path):
+        """Ruta del manifiesto de disposición de una salida"""
+        if self.manifest_dir is None:
+            return output_path + MANIFEST_SUFFIX
+        digest = hashlib.blake2b(
+            os.path.abspath(output_path).encode("utf-8"), digest_size=16
+        ).hexdigest()
+        return os.path.join(self.manifest_dir, digest + MANIFEST_SUFFIX)
+    
+    def _evict_manifests(self):
+        """Borrar los manifiestos más antiguos de `manifest_dir` por encima del límite"""
+        try:
+            names = [n for n in os.listdir(self.manifest_dir) if n.endswith(MANIFEST_SUFFIX)]
+        except OSError:
+            return
+        if len(names) <= self.max_manifests:
+            return
+        
+        paths = []
+        for name in names:
+            path = os.path.join(self.manifest_dir, name)
+            try:
+                paths.append((os.stat(path).st_mtime_ns, path))
+            except OSError:
+                continue
+        paths.sort()
+        for _, path in paths[:len(paths) - self.max_manifests]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _entry(self, file_path, size, position):
+        """Firma de una imagen colocada: ruta, mtime, bytes, tamaño y posición"""
+        stat = os.stat(file_path)
+        return [os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size,
+                size[0], size[1], position[0], position[1]]
+    
+    def _load_previous(self, output_path, params):
+        """Recuperar (manifiesto, imagen) anteriores si son reutilizables"""
+        output_path = os.path.abspath(output_path)
+        if self._last and self._last[0] == output_path and self._last[1]["params"] == params:
+            return self._last[1], self._last[2]
+        
+        try:
+            with open(self.manifest_path(output_path), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if manifest.get("params") != params or manifest.get("format") not in LOSSLESS_FORMATS:
+            return None
+        
+        try:
+            stat = os.stat(output_path)
+            if [stat.st_mtime_ns, stat.st_size] != manifest.get("output"):
+                return None
+            image = Image.open(output_path)
+            image.load()
+        except OSError:
+            return None
+        
+        if list(image.size) != manifest["canvas"]:
+            return None
+        expected_mode = manifest.get("canvas_mode") or (
+            "RGBA" if params["background"].upper() == "TRANSPARENT" else "RGB"
+        )
+        if image.mode != expected_mode:
+            image = image.convert(expected_mode)
+        return manifest, image
+    
+    def merge(self, file_paths, output_path, mode="vertical", spacing=0,
+              background_color="#FFFFFF", max_dimension=None,
+              progress_callback=None, timings=None, layout_options=None):
+        """Combinar reutilizando el resultado anterior de `output_path`
+        
+        Devuelve (imagen, estadísticas) donde las estadísticas indican cuántas
+        imágenes se reutilizaron y cuántas se pegaron de nuevo.
+        """
+        if timings is None:
+            timings = {}
+        params = {
+            "mode": mode, "spacing": spacing,
+            "background": background_color, "max_dimension": max_dimension,
+        }
+        
+        if mode not in ("vertical", "horizontal"):
+            result = self.processor.merge_files(
+                file_paths, mode, spacing, background_color,
+                max_dimension=max_dimension, progress_callback=progress_callback,
+                timings=timings, layout_options=layout_options
+            )
+            self._pending = (result, None)
+            return result, {"reused": 0, "pasted": len(file_paths)}
+        
+        start = time.perf_counter()
+        plan = self.processor.plan_layout(
+            file_paths, mode, spacing, background_color, max_dimension
+        )
+        sizes, canvas_size, positions = plan.sizes, plan.canvas_size, plan.positions
+        entries = [self._entry(p, s, pos) for p, s, pos in zip(file_paths, sizes, positions)]
+        manifest = {
+            "params": params, "canvas": list(canvas_size),
+            "canvas_mode": plan.canvas_mode, "entries": entries,
+        }
+        timings["cabeceras"] = time.perf_counter() - start
+        
+        previous = self._load_previous(output_path, params)
+        cross_axis = 0 if mode == "vertical" else 1
+        if previous and previous[0]["canvas"][cross_axis] != canvas_size[cross_axis]:
+            # Cambia el centrado de todas las imágenes
+            previous = None
+        if previous and previous[1].mode != plan.canvas_mode:
+            # Las fuentes nuevas no caben en el modo del resultado anterior
+            previous = None
+        
+        changed = list(range(len(entries)))
+        if previous:
+            old_entries = previous[0]["entries"]
+            changed = [
+                i for i, entry in enumerate(entries)
+                if i >= len(old_entries) or old_entries[i] != entry
+            ]
+        
+        # Si cambia casi todo, no compensa partir del resultado anterior
+        if previous is None or \
+                len(changed) > len(entries) * APP_CONFIG["incremental_max_changed_ratio"]:
+            result = self.processor.composite(
+                plan, progress_callback=progress_callback, timings=timings
+            )
+            self._pending = (result, manifest)
+            return result, {"reused": 0, "pasted": len(entries)}
+        
+        start = time.perf_counter()
+        old_manifest, old_image = previous
+        result = self.processor.create_plan_canvas(plan)
+        result.paste(old_image.crop((0, 0, min(old_image.width, canvas_size[0]),
+                                     min(old_image.height, canvas_size[1]))), (0, 0))
+        
+        # Borrar lo que ocupaban las imágenes que ya no están o cambiaron
+        old_entries = old_manifest["entries"]
+        for i, old in enumerate(old_entries):
+            if i < len(entries) and entries[i] == old:
+                continue
+            width, height, x, y = old[3:7]
+            result.paste(self.processor.create_plan_canvas(plan, (width, height)), (x, y))
+        timings["reutilización"] = time.perf_counter() - start
+        
+        # Decodificar y pegar solo las imágenes nuevas o modificadas
+        timings["decodificación"] = 0.0
+        decoded = self.processor.iter_decoded(
+            [file_paths[i] for i in changed], target_sizes=[sizes[i] for i in changed],
+            modes=[plan.source_modes[i] for i in changed]
+        )
+        try:
+            for count, i in enumerate(changed):
+                if progress_callback:
+                    progress_callback(count, len(changed))
+                start = time.perf_counter()
+                image = next(decoded)
+                timings["decodificación"] += time.perf_counter() - start
+                self.processor.paste_image(result, image, positions[i])
+                del image
+        finally:
+            decoded.close()
+        
+        self._pending = (result, manifest)
+        return result, {"reused": len(entries) - len(changed), "pasted": len(changed)}
+    
+    def save(self, image, output_path, format="PNG", quality=95, png_profile=None,
+             extra_outputs=None, max_bytes=None):
+        """Guardar el resultado y su manifiesto para la próxima re-combinación
+        
+        `extra_outputs` (lista de (ruta, formato, calidad)) se codifican a la
+        vez que la salida principal; el manifiesto solo describe la principal.
+        Devuelve el informe de `save_outputs`.
+        """
+        saved = self.processor.save_outputs(
+            image, [(output_path, format, quality)] + list(extra_outputs or []), png_profile,
+            max_bytes=max_bytes
+        )
+        
+        manifest_path = self.manifest_path(output_path)
+        manifest = self._pending[1] if self._pending and self._pending[0] is image else None
+        self._pending = None
+        if manifest is None:
+            # Resultado sin disposición reutilizable: descartar un manifiesto viejo
+            if os.path.exists(manifest_path):
+                os.remove(manifest_path)
+            self._last = None
+            return saved
+        
+        if self.manifest_dir is not None:
+            os.makedirs(self.manifest_dir, exist_ok=True)
+        stat = os.stat(output_path)
+        manifest["format"] = format.upper()
+        manifest["output"] = [stat.st_mtime_ns, stat.st_size]
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+        if self.manifest_dir is not None:
+            self._evict_manifests()
+        
+        if self.keep_in_memory:
+            self._last = (os.path.abspath(output_path), manifest, image)
+        return saved
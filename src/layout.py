@@ -0,0 +1,279 @@
+"""
+Cálculo de la disposición de las imágenes, separado de la composición
+
+Todas las funciones reciben solo dimensiones (ancho, alto) y devuelven
+(tamaño del lienzo, posiciones) en el orden de entrada, sin tocar píxeles.
+
+Modos:
+- vertical / horizontal: una fila o columna, centrando cada imagen.
+- grid: N columnas (o N filas); las celdas pueden tener todas el tamaño de la
+  imagen mayor ("uniform") o ajustarse al ancho de cada columna y al alto de
+  cada fila ("rowcol").
+- packed: empaquetado automático por estantes que busca el lienzo de menor
+  área.
+
+`LayoutPlan` guarda el resultado (lienzo y rectángulo de cada fuente) junto
+con los parámetros que lo produjeron; se serializa a JSON y lo consume el
+compositor, de modo que la misma geometría sirve para vistas previas,
+estimaciones en seco, escritura por franjas y re-combinación incremental.
+"""
+
+import json
+import math
+import os
+from collections import namedtuple
+
+LAYOUT_MODES = ("vertical", "horizontal", "grid", "packed")
+CELL_SIZINGS = ("uniform", "rowcol")
+
+# Proporciones (respecto a un lienzo cuadrado) que prueba el empaquetado
+PACK_WIDTH_FACTORS = (0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.4, 1.6, 1.8, 2.0, 2.5, 3.0)
+
+# Bytes por píxel del lienzo y de una fuente decodificada
+BYTES_PER_PIXEL = {"L": 1, "LA": 2, "P": 1, "RGB": 3, "RGBA": 4}
+
+# `alpha` indica que la fuente tiene transparencia propia
+Placement = namedtuple("Placement", "path x y width height alpha", defaults=(False,))
+
+
+def linear_layout(sizes, mode, spacing):
+    """Una fila (horizontal) o columna (vertical) con las imágenes centradas"""
+    gaps = spacing * (len(sizes) - 1)
+    if mode == "vertical":
+        canvas_size = (max(w for w, h in sizes), sum(h for w, h in sizes) + gaps)
+    else:
+        canvas_size = (sum(w for w, h in sizes) + gaps, max(h for w, h in sizes))
+    
+    positions = []
+    offset = 0
+    for width, height in sizes:
+        if mode == "vertical":
+            positions.append(((canvas_size[0] - width) // 2, offset))
+            offset += height + spacing
+        else:
+            positions.append((offset, (canvas_size[1] - height) // 2))
+            offset += width + spacing
+    
+    return canvas_size, positions
+
+
+def grid_shape(count, columns=None, rows=None):
+    """Columnas y filas de la cuadrícula; por defecto 2 columnas"""
+    if (columns is not None and columns < 1) or (rows is not None and rows < 1):
+        raise ValueError("Las columnas y filas de la cuadrícula deben ser mayores que cero")
+    if columns:
+        columns = min(columns, count)
+    elif rows:
+        columns = math.ceil(count / min(rows, count))
+    else:
+        columns = min(2, count)
+    return columns, math.ceil(count / columns)
+
+
+def grid_layout(sizes, spacing, columns=None, rows=None, cell_sizing="uniform"):
+    """Cuadrícula llenada por filas, con cada imagen centrada en su celda"""
+    columns, rows = grid_shape(len(sizes), columns, rows)
+    
+    if cell_sizing == "rowcol":
+        col_widths = [0] * columns
+        row_heights = [0] * rows
+        for i, (width, height) in enumerate(sizes):
+            col_widths[i % columns] = max(col_widths[i % columns], width)
+            row_heights[i // columns] = max(row_heights[i // columns], height)
+    elif cell_sizing == "uniform":
+        col_widths = [max(w for w, h in sizes)] * columns
+        row_heights = [max(h for w, h in sizes)] * rows
+    else:
+        raise ValueError(f"Ajuste de celdas desconocido: {cell_sizing}")
+    
+    col_x = [0] * columns
+    for col in range(1, columns):
+        col_x[col] = col_x[col - 1] + col_widths[col - 1] + spacing
+    row_y = [0] * rows
+    for row in range(1, rows):
+        row_y[row] = row_y[row - 1] + row_heights[row - 1] + spacing
+    
+    canvas_size = (col_x[-1] + col_widths[-1], row_y[-1] + row_heights[-1])
+    positions = []
+    for i, (width, height) in enumerate(sizes):
+        row, col = i // columns, i % columns
+        positions.append((
+            col_x[col] + (col_widths[col] - width) // 2,
+            row_y[row] + (row_heights[row] - height) // 2,
+        ))
+    
+    return canvas_size, positions
+
+
+def _shelf_pack(sizes, order, spacing, max_width):
+    """Empaquetar por estantes (primer estante donde quepa, alturas decrecientes)"""
+    shelves = []  # [y, alto, x libre]
+    positions = [None] * len(sizes)
+    bottom = 0
+    for i in order:
+        width, height = sizes[i]
+        for shelf in shelves:
+            if shelf[2] + width <= max_width:
+                break
+        else:
+            y = bottom + spacing if shelves else 0
+            shelf = [y, height, 0]
+            shelves.append(shelf)
+            bottom = y + height
+        positions[i] = (shelf[2], shelf[0])
+        shelf[2] += width + spacing
+    
+    canvas_width = max(shelf[2] - spacing for shelf in shelves)
+    return (canvas_width, bottom), positions
+
+
+def packed_layout(sizes, spacing):
+    """Empaquetado automático que minimiza el área del lienzo
+    
+    Prueba varios anchos máximos alrededor del lado de un cuadrado con la
+    misma área que las imágenes y se queda con el lienzo más pequeño (a igual
+    área, el más cercano a cuadrado). No conserva el orden visual de entrada.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    area = sum((w + spacing) * (h + spacing) for w, h in sizes)
+    widest = max(w for w, h in sizes)
+    total_width = sum(w for w, h in sizes) + spacing * (len(sizes) - 1)
+    
+    candidates = {min(max(widest, int(math.sqrt(area) * f)), total_width)
+                  for f in PACK_WIDTH_FACTORS}
+    best = None
+    for max_width in sorted(candidates):
+        canvas_size, positions = _shelf_pack(sizes, order, spacing, max_width)
+        score = (canvas_size[0] * canvas_size[1], abs(canvas_size[0] - canvas_size[1]))
+        if best is None or score < best[0]:
+            best = (score, canvas_size, positions)
+    
+    return best[1], best[2]
+
+
+def compute_layout(sizes, mode, spacing=0, columns=None, rows=None, cell_sizing="uniform"):
+    """Calcular (lienzo, posiciones) del modo indicado"""
+    if not sizes:
+        raise ValueError("No hay imágenes para combinar")
+    if spacing < 0:
+        raise ValueError("El espacio entre imágenes no puede ser negativo")
+    if mode in ("vertical", "horizontal"):
+        return linear_layout(sizes, mode, spacing)
+    if mode == "grid":
+        return grid_layout(sizes, spacing, columns, rows, cell_sizing)
+    if mode == "packed":
+        return packed_layout(sizes, spacing)
+    raise ValueError(f"Modo de combinación desconocido: {mode}")
+
+
+class LayoutPlan:
+    """Disposición de una combinación: lienzo y rectángulo de cada fuente
+    
+    Se calcula solo con cabeceras. `width` y `height` de cada colocación son
+    el tamaño con el que se pega la fuente (ya reducida si se pidió
+    `max_dimension`). `canvas_mode` es el modo más estrecho que cubre todas
+    las fuentes (L, LA, P, RGB o RGBA); con "P", `palette` es la paleta
+    común de las fuentes.
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, canvas_size, placements, mode="vertical", spacing=0,
+                 background_color="#FFFFFF", options=None, canvas_mode=None, palette=None):
+        self.canvas_size = tuple(canvas_size)
+        self.placements = list(placements)
+        self.mode = mode
+        self.spacing = spacing
+        self.background_color = background_color
+        self.options = dict(options or {})
+        if canvas_mode is None:
+            canvas_mode = "RGBA" if background_color.upper() == "TRANSPARENT" else "RGB"
+        self.canvas_mode = canvas_mode
+        self.palette = list(palette) if palette else None
+    
+    def source_mode(self, placement):
+        """Modo en que se decodifica una fuente para pegarla en este lienzo
+        
+        Las fuentes con transparencia sobre un lienzo opaco conservan su alfa
+        para pegarse con máscara sobre el fondo.
+        """
+        if placement.alpha and self.canvas_mode in ("L", "RGB"):
+            return self.canvas_mode + "A"
+        return self.canvas_mode
+    
+    @property
+    def source_modes(self):
+        return [self.source_mode(p) for p in self.placements]
+    
+    @property
+    def paths(self):
+        return [p.path for p in self.placements]
+    
+    @property
+    def sizes(self):
+        return [(p.width, p.height) for p in self.placements]
+    
+    @property
+    def positions(self):
+        return [(p.x, p.y) for p in self.placements]
+    
+    def __len__(self):
+        return len(self.placements)
+    
+    def canvas_bytes(self):
+        """Memoria del lienzo de salida"""
+        width, height = self.canvas_size
+        return width * height * BYTES_PER_PIXEL[self.canvas_mode]
+    
+    def estimate_bytes(self):
+        """Pico de memoria de la composición en streaming: lienzo y mayor fuente"""
+        largest = max(
+            p.width * p.height * BYTES_PER_PIXEL[self.source_mode(p)] for p in self.placements
+        )
+        return self.canvas_bytes() + largest
+    
+    def to_dict(self):
+        """Representación serializable a JSON
+        
+        Las rutas de las fuentes se guardan absolutas para que el plan pueda
+        componerse desde cualquier directorio de trabajo.
+        """
+        return {
+            "version": self.VERSION,
+            "mode": self.mode,
+            "spacing": self.spacing,
+            "background": self.background_color,
+            "options": self.options,
+            "canvas": list(self.canvas_size),
+            "canvas_mode": self.canvas_mode,
+            "palette": self.palette,
+            "placements": [
+                [os.path.abspath(p.path)] + list(p[1:]) for p in self.placements
+            ],
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruir un plan desde `to_dict`"""
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Versión de plan no soportada: {data.get('version')}")
+        try:
+            placements = [Placement(*entry) for entry in data["placements"]]
+            return cls(
+                data["canvas"], placements, data["mode"], data["spacing"],
+                data["background"], data.get("options"),
+                data.get("canvas_mode"), data.get("palette"),
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Plan de disposición inválido: {e}")
+    
+    def save(self, file_path):
+        """Guardar el plan como JSON"""
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+    
+    @classmethod
+    def load(cls, file_path):
+        """Leer un plan guardado con `save`"""
+        with open(file_path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
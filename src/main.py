@@ -3,11 +3,18 @@
 Image Merger Tool - Aplicación principal
 """
 
-import tkinter as tk
-from gui import MainWindow
+import sys
 
 def main():
     """Función principal que inicia la aplicación"""
+    # Con argumentos se usa la línea de comandos, sin cargar tkinter
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        return cli_main(sys.argv[1:])
+    
+    import tkinter as tk
+    from gui import MainWindow
+    
     try:
         # Crear ventana principal
         root = tk.Tk()
@@ -30,4 +37,4 @@ def main():
         input("Presiona Enter para salir...")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Medición del uso de memoria del proceso sin dependencias externas
+"""
+
+import os
+import sys
+
+
+def _windows_memory_counters():
+    """Leer los contadores de memoria del proceso en Windows"""
+    import ctypes
+    from ctypes import wintypes
+    
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+    
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def get_peak_rss_bytes():
+    """Pico de memoria residente del proceso en bytes, o None si no se puede medir"""
+    try:
+        if os.name == "nt":
+            counters = _windows_memory_counters()
+            return counters.PeakWorkingSetSize if counters else None
+        
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa en KB, macOS en bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError, AttributeError):
+        return None
+
+
+def get_rss_bytes():
+    """Memoria residente actual del proceso en bytes, o None si no se puede medir"""
+    try:
+        if os.name == "nt":
+            counters = _windows_memory_counters()
+            return counters.WorkingSetSize if counters else None
+        
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+    
+    # Sin lectura directa del valor actual: usar el pico como aproximación
+    return get_peak_rss_bytes()
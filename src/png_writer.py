@@ -0,0 +1,87 @@
+"""
+Escritor PNG por franjas para lienzos más grandes que la memoria
+"""
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Tipo de color PNG para cada modo de Pillow soportado
+PNG_COLOR_TYPES = {
+    "L": (0, 1),
+    "LA": (4, 2),
+    "P": (3, 1),
+    "RGB": (2, 3),
+    "RGBA": (6, 4),
+}
+
+# Tamaño objetivo de cada bloque IDAT escrito a disco
+IDAT_CHUNK_SIZE = 1024 * 1024
+
+
+def _write_chunk(stream, chunk_type, data):
+    """Escribir un bloque PNG con su longitud y CRC"""
+    stream.write(struct.pack(">I", len(data)))
+    stream.write(chunk_type)
+    stream.write(data)
+    stream.write(struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def write_png_strips(file_path, size, mode, bands, compress_level=6,
+                     strategy=zlib.Z_DEFAULT_STRATEGY, palette=None):
+    """Escribir un PNG a partir de un generador de franjas horizontales
+    
+    Cada franja es una imagen de Pillow con el ancho completo del lienzo y el
+    modo indicado; las filas se comprimen y se escriben a medida que llegan,
+    así que la memoria usada es la de una franja, no la del lienzo completo.
+    En modo P hace falta `palette` (lista plana [r, g, b, ...]).
+    """
+    if mode not in PNG_COLOR_TYPES:
+        raise ValueError(f"Modo no soportado para PNG por franjas: {mode}")
+    if mode == "P" and not palette:
+        raise ValueError("El modo P necesita una paleta")
+    
+    width, height = size
+    color_type, channels = PNG_COLOR_TYPES[mode]
+    row_bytes = width * channels
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, zlib.MAX_WBITS, 8, strategy)
+    pending = bytearray()
+    rows_written = 0
+    
+    with open(file_path, "wb") as stream:
+        stream.write(PNG_SIGNATURE)
+        _write_chunk(stream, b"IHDR", struct.pack(
+            ">IIBBBBB", width, height, 8, color_type, 0, 0, 0
+        ))
+        if mode == "P":
+            _write_chunk(stream, b"PLTE", bytes(palette[:768]))
+        
+        for band in bands:
+            if band.width != width or band.mode != mode:
+                raise ValueError("La franja no coincide con el lienzo")
+            
+            data = band.tobytes()
+            filtered = bytearray()
+            for start in range(0, len(data), row_bytes):
+                # Filtro 0 (ninguno) delante de cada fila
+                filtered.append(0)
+                filtered += data[start:start + row_bytes]
+            rows_written += band.height
+            
+            pending += compressor.compress(bytes(filtered))
+            while len(pending) >= IDAT_CHUNK_SIZE:
+                _write_chunk(stream, b"IDAT", bytes(pending[:IDAT_CHUNK_SIZE]))
+                del pending[:IDAT_CHUNK_SIZE]
+        
+        if rows_written != height:
+            raise ValueError(
+                f"Se esperaban {height} filas y se recibieron {rows_written}"
+            )
+        
+        pending += compressor.flush()
+        for start in range(0, len(pending), IDAT_CHUNK_SIZE):
+            _write_chunk(stream, b"IDAT", bytes(pending[start:start + IDAT_CHUNK_SIZE]))
+        _write_chunk(stream, b"IEND", b"")
+    
+    return True
@@ -0,0 +1,141 @@
+"""
+Escáner de carpetas en una sola pasada con índice de cabeceras
+
+Recorre cada carpeta una única vez con `os.scandir`, clasifica los archivos
+por extensión y por sus bytes mágicos, y lee solo la cabecera de cada imagen
+(dimensiones, modo, formato y paleta) sin decodificar píxeles.
+"""
+
+import os
+from collections import namedtuple
+from PIL import Image
+from image_processor import ImageHeader, image_header
+
+# Firmas de los formatos soportados: (desplazamiento, bytes, formato)
+MAGIC_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "JPEG"),
+    (0, b"\x89PNG\r\n\x1a\n", "PNG"),
+    (0, b"GIF87a", "GIF"),
+    (0, b"GIF89a", "GIF"),
+    (0, b"BM", "BMP"),
+    (8, b"WEBP", "WEBP"),
+    (0, b"II*\x00", "TIFF"),
+    (0, b"MM\x00*", "TIFF"),
+]
+
+ImageEntry = namedtuple(
+    "ImageEntry", "path name file_size mtime_ns width height mode format alpha palette"
+)
+
+
+def detect_format(head):
+    """Formato según los primeros bytes del archivo, o None si no es imagen"""
+    for offset, magic, format_name in MAGIC_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if format_name == "WEBP" and head[:4] != b"RIFF":
+                continue
+            return format_name
+    return None
+
+
+class ImageIndex:
+    """Índice compacto de imágenes con sus metadatos de cabecera"""
+    
+    def __init__(self, entries=None, rejected=None):
+        self.entries = list(entries or [])
+        self.rejected = list(rejected or [])
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def __iter__(self):
+        return iter(self.entries)
+    
+    def paths(self):
+        """Rutas indexadas, en orden"""
+        return [entry.path for entry in self.entries]
+    
+    def sizes(self):
+        """Dimensiones (ancho, alto) de cada imagen, en orden"""
+        return [(entry.width, entry.height) for entry in self.entries]
+    
+    def total_pixels(self):
+        """Suma de píxeles de todas las imágenes"""
+        return sum(entry.width * entry.height for entry in self.entries)
+    
+    def total_bytes(self):
+        """Suma del tamaño en disco de todas las imágenes"""
+        return sum(entry.file_size for entry in self.entries)
+
+
+def read_entry(path, name, stat):
+    """Leer bytes mágicos y cabecera de un archivo con una sola apertura"""
+    with open(path, "rb") as f:
+        head = f.read(16)
+        format_name = detect_format(head)
+        if format_name is None:
+            return None
+        
+        f.seek(0)
+        with Image.open(f) as img:
+            header = image_header(img)
+            return ImageEntry(
+                path, name, stat.st_size, stat.st_mtime_ns,
+                img.width, img.height, img.mode, img.format or format_name,
+                header.alpha, header.palette,
+            )
+
+
+def scan_folder(folder, extensions, recursive=False, processor=None):
+    """Indexar las imágenes de una carpeta en una sola pasada
+    
+    Solo se consideran archivos con una extensión de `extensions`; los que no
+    tienen una firma de imagen válida o cuya cabecera no se puede leer quedan
+    en `rejected`. Si se indica `processor`, sus cabeceras (dimensiones, modo y
+    paleta) se registran en su caché para que la combinación no vuelva a abrirlos.
+    """
+    extensions = {ext.lower() for ext in extensions}
+    entries = []
+    rejected = []
+    pending = [folder]
+    
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as items:
+                items = sorted(items, key=lambda item: item.name.lower())
+        except OSError:
+            rejected.append(current)
+            continue
+        
+        subfolders = []
+        for item in items:
+            if item.is_dir(follow_symlinks=False):
+                if recursive:
+                    subfolders.append(item.path)
+                continue
+            
+            if os.path.splitext(item.name)[1].lower() not in extensions:
+                continue
+            
+            try:
+                stat = item.stat()
+                entry = read_entry(item.path, item.name, stat)
+            except Exception:
+                entry = None
+            
+            if entry is None:
+                rejected.append(item.path)
+                continue
+            
+            entries.append(entry)
+            if processor is not None:
+                processor.cache_image_header(
+                    entry.path, entry.mtime_ns, entry.file_size,
+                    ImageHeader((entry.width, entry.height), entry.mode, entry.alpha, entry.palette)
+                )
+        
+        # Recorrer subcarpetas en orden alfabético
+        pending.extend(reversed(subfolders))
+    
+    return ImageIndex(entries, rejected)
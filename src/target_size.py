@@ -0,0 +1,130 @@
+"""
+Codificación JPEG/WebP con un tamaño máximo de archivo
+
+Busca la calidad más alta cuyo resultado cabe en el presupuesto de bytes.
+Cada ronda codifica varias calidades en paralelo en memoria y estrecha el
+intervalo como una bisección de varios puntos (el tamaño crece con la
+calidad). Los hilos comparten un único búfer de píxeles de solo lectura:
+cada codificación crea su propio objeto Image sobre él con
+`Image.frombuffer`, sin copiar la imagen por hilo. En imágenes grandes una
+versión reducida sirve para estimar la calidad de partida antes de
+codificar la imagen completa.
+"""
+
+import io
+import math
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config import APP_CONFIG
+
+LOSSY_FORMATS = ("JPEG", "WEBP")
+
+# Margen de calidades alrededor de la estimación en la primera ronda
+PROBE_WINDOW = 6
+
+SizedEncode = namedtuple("SizedEncode", "data quality trials fits")
+
+
+def shared_pixels(image):
+    """Píxeles en un búfer que `Image.frombuffer` puede mapear sin copiar
+    
+    Devuelve (búfer, modo). RGB se empaqueta como RGBX, que JPEG y WebP
+    codifican igual que RGB.
+    """
+    mode = "RGBX" if image.mode == "RGB" else image.mode
+    return image.tobytes("raw", mode), mode
+
+
+def encode(pixels, mode, size, format, quality):
+    """Codificar en memoria y devolver los bytes (seguro entre hilos)"""
+    view = Image.frombuffer(mode, size, pixels, "raw", mode, 0, 1)
+    buffer = io.BytesIO()
+    view.save(buffer, format, quality=quality)
+    return buffer.getvalue()
+
+
+def _spread(lo, hi, count):
+    """Hasta `count` calidades repartidas dentro de [lo, hi]"""
+    if hi - lo + 1 <= count:
+        return list(range(lo, hi + 1))
+    step = (hi - lo) / (count + 1)
+    return sorted({lo + round(step * (i + 1)) for i in range(count)})
+
+
+def _probe_guess(image, format, max_bytes, lo, hi, workers):
+    """Estimar la calidad objetivo buscando sobre una versión reducida
+    
+    El presupuesto se reparte en proporción al área; devuelve (calidad
+    estimada o None, codificaciones de prueba usadas).
+    """
+    factor = math.ceil(math.sqrt(image.width * image.height / APP_CONFIG["target_size_probe_pixels"]))
+    if factor < 2:
+        return None, 0
+    
+    probe = image.reduce(factor)
+    ratio = (probe.width * probe.height) / (image.width * image.height)
+    result = encode_to_size(probe, format, max_bytes * ratio, lo, hi, workers, probe=False)
+    return result.quality, result.trials
+
+
+def encode_to_size(image, format, max_bytes, min_quality=None, max_quality=None,
+                   workers=None, probe=True):
+    """Codificar con la mayor calidad que no supere `max_bytes`
+    
+    Primero se prueba la calidad máxima y, si cabe, se devuelve sin buscar.
+    Devuelve SizedEncode(bytes, calidad, codificaciones de prueba, cabe). Si
+    ni la calidad mínima cabe, se devuelve esa codificación con `fits=False`.
+    """
+    format = format.upper()
+    if format not in LOSSY_FORMATS:
+        raise ValueError(f"El tamaño objetivo solo se aplica a JPEG o WebP, no a {format}")
+    lo = min_quality or APP_CONFIG["target_size_min_quality"]
+    hi = max_quality or APP_CONFIG["target_size_max_quality"]
+    workers = workers or APP_CONFIG["target_size_workers"]
+    
+    pixels, mode = shared_pixels(image)
+    
+    # Si ya cabe con la calidad máxima no hace falta buscar
+    data = encode(pixels, mode, image.size, format, hi)
+    if len(data) <= max_bytes:
+        return SizedEncode(data, hi, 1, True)
+    best = None             # (calidad, bytes) más alta que cabe
+    smallest = (hi, data)   # (calidad, bytes) de la calidad mínima probada
+    trials = 1
+    hi -= 1
+    
+    guess = None
+    if probe and lo <= hi:
+        guess, probe_trials = _probe_guess(image, format, max_bytes, lo, hi, workers)
+        trials += probe_trials
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while lo <= hi:
+            if guess is not None:
+                # Primera ronda alrededor de la estimación
+                qualities = _spread(
+                    max(lo, guess - PROBE_WINDOW), min(hi, guess + PROBE_WINDOW), workers
+                )
+                guess = None
+            else:
+                qualities = _spread(lo, hi, workers)
+            
+            encoded = list(pool.map(
+                lambda q: encode(pixels, mode, image.size, format, q), qualities
+            ))
+            trials += len(qualities)
+            
+            for quality, data in zip(qualities, encoded):
+                if smallest is None or quality < smallest[0]:
+                    smallest = (quality, data)
+                if len(data) <= max_bytes:
+                    if best is None or quality > best[0]:
+                        best = (quality, data)
+                    lo = max(lo, quality + 1)
+                else:
+                    hi = min(hi, quality - 1)
+    
+    if best is not None:
+        return SizedEncode(best[1], best[0], trials, True)
+    return SizedEncode(smallest[1], smallest[0], trials, False)
@@ -0,0 +1,253 @@
+"""
+Generación asíncrona y caché de miniaturas para la lista de imágenes
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config import APP_CONFIG, get_cache_dir
+
+# Bytes iniciales del archivo que entran en la huella de contenido
+HASH_PREFIX_BYTES = 64 * 1024
+
+
+class ThumbnailCache:
+    """Caché LRU de miniaturas indexada por (ruta, mtime, tamaño de archivo)"""
+    
+    def __init__(self, max_items=None):
+        self.max_items = max_items or APP_CONFIG["thumbnail_cache_items"]
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(file_path):
+        """Clave que cambia si el archivo se modifica"""
+        stat = os.stat(file_path)
+        return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    
+    def get(self, key):
+        """Obtener una miniatura y marcarla como usada recientemente"""
+        with self._lock:
+            image = self._items.get(key)
+            if image is not None:
+                self._items.move_to_end(key)
+            return image
+    
+    def put(self, key, image):
+        """Guardar una miniatura descartando las menos usadas"""
+        with self._lock:
+            self._items[key] = image
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+    
+    def clear(self):
+        """Vaciar la caché"""
+        with self._lock:
+            self._items.clear()
+
+
+class DiskThumbnailCache:
+    """Caché persistente de miniaturas en un único archivo SQLite
+    
+    La clave combina ruta, mtime, tamaño de archivo y un hash de los primeros
+    bytes, de modo que un archivo reemplazado con el mismo mtime no reutiliza
+    una miniatura vieja. Al superar `max_bytes` se descartan las entradas
+    usadas hace más tiempo.
+    """
+    
+    def __init__(self, db_path=None, max_bytes=None):
+        if db_path is None:
+            db_path = os.path.join(get_cache_dir(), "thumbnails.sqlite3")
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        
+        self.max_bytes = max_bytes or APP_CONFIG["thumbnail_disk_cache_mb"] * 1024 * 1024
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            "key TEXT PRIMARY KEY, data BLOB NOT NULL, "
+            "bytes INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS thumbnails_accessed ON thumbnails (accessed)"
+        )
+        self._conn.commit()
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(bytes), 0) FROM thumbnails"
+        ).fetchone()[0]
+    
+    @staticmethod
+    def make_key(file_path, size):
+        """Clave persistente: ruta, mtime, tamaño, hash de cabecera y tamaño de miniatura"""
+        stat = os.stat(file_path)
+        with open(file_path, "rb") as f:
+            digest = hashlib.blake2b(f.read(HASH_PREFIX_BYTES), digest_size=8).hexdigest()
+        return "|".join([
+            os.path.abspath(file_path), str(stat.st_mtime_ns), str(stat.st_size),
+            digest, f"{size[0]}x{size[1]}",
+        ])
+    
+    def get(self, key):
+        """Leer una miniatura guardada, o None si no existe"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM thumbnails WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE thumbnails SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        
+        image = Image.open(io.BytesIO(row[0]))
+        image.load()
+        return image
+    
+    def put(self, key, image):
+        """Guardar una miniatura y aplicar el límite de tamaño"""
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG")
+        data = buffer.getvalue()
+        
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT bytes FROM thumbnails WHERE key = ?", (key,)
+            ).fetchone()
+            if old:
+                self._total -= old[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO thumbnails (key, data, bytes, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self._total += len(data)
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Descartar las entradas más antiguas hasta quedar bajo el límite"""
+        while self._total > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, bytes FROM thumbnails ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                break
+            for key, size in rows:
+                self._conn.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+                self._total -= size
+                if self._total <= self.max_bytes:
+                    break
+    
+    def close(self):
+        """Cerrar la base de datos"""
+        with self._lock:
+            self._conn.close()
+
+
+class ThumbnailLoader:
+    """Genera miniaturas en segundo plano y las entrega en el hilo de la interfaz
+    
+    `schedule` recibe una función sin argumentos y debe ejecutarla en el hilo
+    de la interfaz (p. ej. `lambda fn: root.after(0, fn)`). Las miniaturas se
+    entregan como imágenes de Pillow; convertirlas a PhotoImage es cosa de la GUI.
+    Con `disk_cache=False` no se usa la caché persistente. Los archivos que no
+    se pudieron decodificar se recuerdan (mientras no cambien) y se entregan
+    como None sin volver a intentarlo.
+    """
+    
+    def __init__(self, processor, schedule, size=None, workers=None, cache=None,
+                 disk_cache=None):
+        self.processor = processor
+        self.schedule = schedule
+        self.size = tuple(size or APP_CONFIG["thumbnail_size"])
+        self.cache = cache or ThumbnailCache()
+        
+        self.disk_cache = disk_cache
+        if disk_cache is None and APP_CONFIG["thumbnail_disk_cache"]:
+            try:
+                self.disk_cache = DiskThumbnailCache()
+            except (OSError, sqlite3.Error):
+                # Sin caché persistente si la carpeta no es escribible
+                self.disk_cache = None
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or APP_CONFIG["thumbnail_workers"]
+        )
+        self._waiting = {}
+        self._failed = set()
+    
+    def get_cached(self, file_path):
+        """Miniatura ya en memoria, o None (sin lanzar ninguna carga)"""
+        try:
+            return self.cache.get(ThumbnailCache.make_key(file_path))
+        except OSError:
+            return None
+    
+    def request(self, file_path, callback):
+        """Pedir la miniatura de un archivo; `callback(imagen o None)`"""
+        try:
+            key = ThumbnailCache.make_key(file_path)
+        except OSError:
+            callback(None)
+            return
+        
+        image = self.cache.get(key)
+        if image is not None or key in self._failed:
+            callback(image)
+            return
+        
+        # Varias peticiones del mismo archivo comparten una sola decodificación
+        if key in self._waiting:
+            self._waiting[key].append(callback)
+            return
+        self._waiting[key] = [callback]
+        self._pool.submit(self._load, key, file_path)
+    
+    def _load(self, key, file_path):
+        """Decodificar en un worker y programar la entrega"""
+        try:
+            image = self._load_persistent(file_path)
+            self.cache.put(key, image)
+        except Exception:
+            image = None
+        self.schedule(lambda: self._deliver(key, image))
+    
+    def _load_persistent(self, file_path):
+        """Buscar en la caché en disco antes de decodificar el archivo"""
+        if not self.disk_cache:
+            return self.processor.load_thumbnail(file_path, self.size)
+        
+        try:
+            disk_key = DiskThumbnailCache.make_key(file_path, self.size)
+            image = self.disk_cache.get(disk_key)
+        except (OSError, sqlite3.Error):
+            return self.processor.load_thumbnail(file_path, self.size)
+        
+        if image is None:
+            image = self.processor.load_thumbnail(file_path, self.size)
+            try:
+                self.disk_cache.put(disk_key, image)
+            except sqlite3.Error:
+                pass
+        return image
+    
+    def _deliver(self, key, image):
+        """Entregar la miniatura a todos los que la esperaban"""
+        if image is None:
+            self._failed.add(key)
+        for callback in self._waiting.pop(key, []):
+            callback(image)
+    
+    def shutdown(self):
+        """Detener los workers y cerrar la caché en disco"""
+        self._pool.shutdown(wait=True)
+        if self.disk_cache:
+            self.disk_cache.close()
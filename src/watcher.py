@@ -0,0 +1,272 @@
+"""
+Vigilancia de carpetas que combina automáticamente las imágenes que llegan
+
+En Linux se usa inotify (vía ctypes, sin dependencias externas); en el resto
+de sistemas, o si inotify no está disponible, se sondea la carpeta.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import struct
+import sys
+import time
+from config import APP_CONFIG
+
+# Eventos de inotify: archivo cerrado tras escribir o movido a la carpeta
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Detecta archivos nuevos comparando instantáneas de las carpetas
+    
+    Un archivo se informa cuando su tamaño y mtime no cambian entre dos
+    sondeos seguidos, para no tomar archivos a medio copiar.
+    """
+    
+    def __init__(self, folders, include_existing=False):
+        self.folders = list(folders)
+        self._pending = {}
+        self._reported = {}
+        if not include_existing:
+            for path, signature in self._snapshot().items():
+                self._reported[path] = signature
+    
+    def _snapshot(self):
+        """Leer (tamaño, mtime) de cada archivo de las carpetas vigiladas"""
+        files = {}
+        for folder in self.folders:
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            stat = entry.stat()
+                            files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+        return files
+    
+    def poll(self, timeout):
+        """Esperar `timeout` segundos y devolver los archivos nuevos ya estables"""
+        time.sleep(timeout)
+        ready = []
+        current = self._snapshot()
+        for path, signature in current.items():
+            if self._reported.get(path) == signature:
+                continue
+            if self._pending.get(path) == signature:
+                ready.append(path)
+                self._reported[path] = signature
+                self._pending.pop(path)
+            else:
+                self._pending[path] = signature
+        
+        # Olvidar archivos que ya no existen
+        for path in set(self._reported) - set(current):
+            del self._reported[path]
+        for path in set(self._pending) - set(current):
+            del self._pending[path]
+        return sorted(ready)
+    
+    def close(self):
+        """Nada que liberar en el modo de sondeo"""
+
+
+class InotifyWatcher:
+    """Detecta archivos terminados de escribir mediante inotify (solo Linux)"""
+    
+    def __init__(self, folders, include_existing=False):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify no está disponible en este sistema")
+        
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falló")
+        
+        self._folders = {}
+        for folder in folders:
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO
+            )
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"No se puede vigilar {folder}")
+            self._folders[wd] = folder
+        
+        # Los archivos previos solo se entregan si se piden expresamente
+        self._initial = []
+        if include_existing:
+            for folder in folders:
+                with os.scandir(folder) as entries:
+                    self._initial.extend(e.path for e in entries if e.is_file())
+    
+    def poll(self, timeout):
+        """Esperar hasta `timeout` segundos y devolver los archivos completados"""
+        if self._initial:
+            ready, self._initial = sorted(self._initial), []
+            return ready
+        
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        
+        ready = []
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name and wd in self._folders:
+                ready.append(os.path.join(self._folders[wd], os.fsdecode(name)))
+        return sorted(set(ready))
+    
+    def close(self):
+        """Cerrar el descriptor de inotify"""
+        os.close(self._fd)
+
+
+def create_watcher(folders, use_inotify=True, include_existing=False):
+    """Crear un watcher con inotify si es posible y sondeo en otro caso"""
+    if use_inotify:
+        try:
+            return InotifyWatcher(folders, include_existing)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(folders, include_existing)
+
+
+class FolderMergeDaemon:
+    """Agrupa los archivos que llegan y combina cada grupo al cerrarse
+    
+    Reglas de agrupación:
+    - `group_pattern`: expresión regular sobre el nombre; el primer grupo de
+      captura (o la coincidencia completa) es la clave del trabajo. Sin patrón,
+      la clave es la carpeta de origen.
+    - `group_size`: el trabajo se combina al reunir ese número de archivos.
+    - `idle_seconds`: el trabajo se combina si no recibe archivos en ese tiempo.
+    
+    Cada archivo se valida leyendo solo su cabecera al llegar; esa cabecera
+    queda en la caché del procesador y no se vuelve a leer al combinar.
+    """
+    
+    def __init__(self, processor, watcher, output_dir, mode="vertical", spacing=0,
+                 background_color="#FFFFFF", output_format="PNG", quality=None, png_profile=None,
+                 group_pattern=None, group_size=None, idle_seconds=5.0,
+                 poll_interval=1.0, log=None, layout_options=None):
+        self.processor = processor
+        self.watcher = watcher
+        self.output_dir = output_dir
+        self.mode = mode
+        self.spacing = spacing
+        self.background_color = background_color
+        self.layout_options = layout_options
+        self.output_format = output_format
+        self.quality = quality or APP_CONFIG["default_quality"]
+        self.png_profile = png_profile
+        self.group_pattern = re.compile(group_pattern) if group_pattern else None
+        self.group_size = group_size
+        self.idle_seconds = idle_seconds
+        self.poll_interval = poll_interval
+        self.log = log or (lambda message: print(message, file=sys.stderr))
+        self.groups = {}
+        self.completed = 0
+    
+    def group_key(self, file_path):
+        """Clave del trabajo al que pertenece un archivo, o None si no encaja"""
+        if self.group_pattern is None:
+            return os.path.dirname(file_path)
+        match = self.group_pattern.search(os.path.basename(file_path))
+        if match is None:
+            return None
+        return match.group(1) if match.groups() else match.group(0)
+    
+    def add_file(self, file_path):
+        """Registrar un archivo recién llegado en su grupo"""
+        if not self.processor.validate_image(file_path):
+            return
+        # Los resultados propios nunca son entradas
+        if os.path.abspath(os.path.dirname(file_path)) == os.path.abspath(self.output_dir):
+            return
+        key = self.group_key(file_path)
+        if key is None:
+            return
+        
+        try:
+            self.processor.get_image_size(file_path)
+        except Exception as e:
+            self.log(f"⚠️ Ignorado {file_path}: {e}")
+            return
+        
+        # Por ruta: un archivo reescrito o detectado de nuevo sustituye su
+        # entrada y conserva su posición en el grupo
+        group = self.groups.setdefault(key, {"paths": {}, "updated": 0.0})
+        group["paths"][os.path.abspath(file_path)] = file_path
+        group["updated"] = time.monotonic()
+        
+        if self.group_size and len(group["paths"]) >= self.group_size:
+            self.flush(key)
+    
+    def flush(self, key):
+        """Combinar y guardar el grupo indicado"""
+        group = self.groups.pop(key, None)
+        if not group or not group["paths"]:
+            return None
+        
+        name = re.sub(r"[^\w.-]+", "_", os.path.basename(key) or "grupo")
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        extension = "jpg" if self.output_format == "JPEG" else self.output_format.lower()
+        output_path = os.path.join(self.output_dir, f"{name}_{stamp}.{extension}")
+        counter = 1
+        while os.path.exists(output_path):
+            output_path = os.path.join(self.output_dir, f"{name}_{stamp}_{counter}.{extension}")
+            counter += 1
+        
+        try:
+            start = time.perf_counter()
+            result = self.processor.merge_files(
+                list(group["paths"].values()), self.mode, self.spacing, self.background_color,
+                layout_options=self.layout_options
+            )
+            self.processor.save_image(
+                result, output_path, self.output_format, self.quality, self.png_profile
+            )
+            self.completed += 1
+            self.log(
+                f"✅ {len(group['paths'])} imágenes → {output_path} "
+                f"({time.perf_counter() - start:.2f}s)"
+            )
+            return output_path
+        except Exception as e:
+            self.log(f"❌ Error al combinar {key}: {e}")
+            return None
+    
+    def flush_idle(self):
+        """Combinar los grupos que llevan `idle_seconds` sin recibir archivos"""
+        now = time.monotonic()
+        for key in [k for k, g in self.groups.items() if now - g["updated"] >= self.idle_seconds]:
+            self.flush(key)
+    
+    def run_once(self):
+        """Un ciclo: recoger archivos nuevos y cerrar grupos inactivos"""
+        for path in self.watcher.poll(self.poll_interval):
+            self.add_file(path)
+        self.flush_idle()
+    
+    def run(self, should_stop=None):
+        """Bucle principal; al terminar se combinan los grupos pendientes"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            while not (should_stop and should_stop()):
+                self.run_once()
+        finally:
+            for key in list(self.groups):
+                self.flush(key)
+            self.watcher.close()